@@ -5,17 +5,102 @@ Generate PNG images for all SCP files in the data directory
 Author: Farhad Abtahi
 """
 
+import logging
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+# Render off-screen; must be selected before pyplot is first imported
+import matplotlib
+matplotlib.use('Agg')
+
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent / 'src'))
 
 from scp_reader import SCPReader
+from logging_config import PROGRESS_LOGGER, start_progress_listener, init_progress_logging
 import matplotlib.pyplot as plt
 
-def generate_pngs(data_dir='data/original', output_dir='outputs/ecg_images'):
+progress = logging.getLogger(PROGRESS_LOGGER)
+
+# Drop sub-pixel vertices from the dense 500 Hz traces when rasterizing
+plt.rcParams['path.simplify'] = True
+plt.rcParams['path.simplify_threshold'] = 1.0
+
+# Fixed 1280x908 px output; avoids the extra layout pass of bbox_inches='tight'
+PNG_SIZE_INCHES = (12.8, 9.08)
+PNG_DPI = 100
+
+# One figure per style per process, cleared and redrawn for each file
+_figures = {}
+
+
+def _get_figure(style):
+    """Return this process's reusable figure for the given style"""
+    if style not in _figures:
+        _figures[style] = plt.figure()
+    return _figures[style]
+
+
+def _save_png(fig, output_file, relayout=False):
+    """Save a figure at the fixed output size"""
+    fig.set_size_inches(*PNG_SIZE_INCHES)
+    if relayout:
+        # Figures laid out with tight_layout need it redone at the new size
+        fig.tight_layout()
+    fig.savefig(str(output_file), dpi=PNG_DPI)
+
+
+def _render_one(scp_file, output_path):
+    """Render the medical and waveform PNGs for one SCP file (runs in a worker process)"""
+    scp_file = Path(scp_file)
+    try:
+        progress.info(f"\nProcessing: {scp_file.name}")
+        
+        # Parse the SCP file once; both renders below reuse this reader.
+        # Rendering only needs the decoded data, so drop the file mapping now
+        reader = SCPReader(str(scp_file))
+        reader.read_file()
+        reader.close()
+        
+        # If no ECG data was parsed, generate synthetic data
+        if reader.ecg_data is None:
+            progress.warning("  Warning: Could not parse ECG data, generating sample data")
+            reader._generate_sample_data()
+        
+        # Generate both medical format and standard format
+        
+        # Medical format
+        fig = reader.visualize(paper_style=True, show=False,
+                               fig=_get_figure('medical'))
+        if fig:
+            output_file = output_path / f"{scp_file.stem}_medical.png"
+            _save_png(fig, output_file)
+            progress.info(f"  ✓ Saved medical format: {output_file.name}")
+        
+        # Standard waveform format
+        fig = reader.visualize(paper_style=False, show=False,
+                               fig=_get_figure('waveform'))
+        if fig:
+            output_file = output_path / f"{scp_file.stem}_waveform.png"
+            _save_png(fig, output_file, relayout=True)
+            progress.info(f"  ✓ Saved waveform format: {output_file.name}")
+        
+        # Print statistics
+        if reader.ecg_data is not None:
+            progress.info(f"  Stats: {reader.sampling_rate}Hz, {len(reader.ecg_data[0])/reader.sampling_rate:.1f}s, {len(reader.ecg_data)} leads")
+        else:
+            progress.info("  Stats: No ECG data available")
+        
+        return True, scp_file.name
+        
+    except Exception as e:
+        progress.error(f"  ✗ Failed: {scp_file.name}: {str(e)}")
+        return False, scp_file.name
+
+
+def generate_pngs(data_dir='data/original', output_dir='outputs/ecg_images', quiet=False):
     """Generate PNG images for all SCP files"""
     
     data_path = Path(data_dir)
@@ -25,7 +110,8 @@ def generate_pngs(data_dir='data/original', output_dir='outputs/ecg_images'):
     output_path.mkdir(parents=True, exist_ok=True)
     
     # Find all SCP files
-    scp_files = list(data_path.glob('*.SCP'))
+    scp_files = [entry.path for entry in os.scandir(data_path)
+                 if entry.name.endswith('.SCP') and entry.is_file()]
     
     if not scp_files:
         print(f"No SCP files found in {data_dir}")
@@ -35,50 +121,20 @@ def generate_pngs(data_dir='data/original', output_dir='outputs/ecg_images'):
     print(f"Generating PNG images in {output_dir}")
     print("-" * 60)
     
-    success_count = 0
-    failed_files = []
+    # Worker progress is printed by a single listener in this process
+    level = logging.WARNING if quiet else logging.INFO
+    queue, listener = start_progress_listener(level)
+    try:
+        with ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                 initializer=init_progress_logging,
+                                 initargs=(queue, level)) as executor:
+            results = list(executor.map(_render_one, scp_files,
+                                        [output_path] * len(scp_files), chunksize=4))
+    finally:
+        listener.stop()
     
-    for scp_file in scp_files:
-        try:
-            print(f"\nProcessing: {scp_file.name}")
-            
-            # Read SCP file (constructor automatically parses the file)
-            reader = SCPReader(str(scp_file))
-            
-            # If no ECG data was parsed, generate synthetic data
-            if reader.ecg_data is None:
-                print("  Warning: Could not parse ECG data, generating sample data")
-                reader._generate_sample_data()
-            
-            # Generate both medical format and standard format
-            
-            # Medical format
-            fig = reader.visualize(paper_style=True, show=False)
-            if fig:
-                output_file = output_path / f"{scp_file.stem}_medical.png"
-                fig.savefig(str(output_file), dpi=150, bbox_inches='tight')
-                plt.close(fig)
-                print(f"  ✓ Saved medical format: {output_file.name}")
-            
-            # Standard waveform format
-            fig = reader.visualize(paper_style=False, show=False)
-            if fig:
-                output_file = output_path / f"{scp_file.stem}_waveform.png"
-                fig.savefig(str(output_file), dpi=150, bbox_inches='tight')
-                plt.close(fig)
-                print(f"  ✓ Saved waveform format: {output_file.name}")
-            
-            # Print statistics
-            if reader.ecg_data is not None:
-                print(f"  Stats: {reader.sampling_rate}Hz, {len(reader.ecg_data[0])/reader.sampling_rate:.1f}s, {len(reader.ecg_data)} leads")
-            else:
-                print("  Stats: No ECG data available")
-            
-            success_count += 1
-            
-        except Exception as e:
-            print(f"  ✗ Failed: {str(e)}")
-            failed_files.append(scp_file.name)
+    success_count = sum(1 for success, _ in results if success)
+    failed_files = [name for success, name in results if not success]
     
     # Summary
     print("\n" + "=" * 60)
@@ -104,6 +160,8 @@ if __name__ == "__main__":
                        help='Output directory for PNG files (default: outputs/ecg_images)')
     parser.add_argument('--anonymized', action='store_true',
                        help='Process anonymized files instead')
+    parser.add_argument('--quiet', '-q', action='store_true',
+                       help='Only report warnings and errors while processing')
     
     args = parser.parse_args()
     
@@ -114,4 +172,4 @@ if __name__ == "__main__":
         data_dir = args.data_dir
         output_dir = args.output_dir
     
-    generate_pngs(data_dir, output_dir)
\ No newline at end of file
+    generate_pngs(data_dir, output_dir, quiet=args.quiet)
\ No newline at end of file
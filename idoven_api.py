@@ -13,15 +13,24 @@ Created on Tue Oct 14 11:08:39 2025
 """
 
 import requests
+import shutil
 import time
 import json
-from typing import Dict, Optional
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 class IdovenAPIClient:
     """Client for testing Idoven API endpoints."""
    
+    # Most analyses whose results are kept for conditional polls; the
+    # least recently stored one is dropped first
+    ANALYSIS_CACHE_SIZE = 32
+   
     def __init__(self, base_url: str = "https://api.staging.idoven.ai",
                  upload_url: str = "https://upload.staging.idoven.ai"):
         self.base_url = base_url
@@ -29,6 +38,23 @@ class IdovenAPIClient:
         self.access_token = None
         self.refresh_token = None
         self.token_expires_at = 0
+        self._auth_headers = None
+        # analysis_id -> (ETag, result) for conditional status polls; entries
+        # are dropped when wait_for_analysis returns or gives up
+        self._analysis_cache = {}
+       
+        # Persistent session: reuses TCP/TLS connections across requests
+        # and retries transient failures (429/5xx) on idempotent calls. Once
+        # the retries run out the last response is returned, so callers'
+        # raise_for_status() still raises HTTPError
+        retry = Retry(total=3, backoff_factor=0.5,
+                      status_forcelist=[429, 500, 502, 503, 504],
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16,
+                              max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
    
     def authenticate(self, client_id: str, client_secret: str) -> Dict:
         """
@@ -52,12 +78,13 @@ class IdovenAPIClient:
             "Content-Type": "application/x-www-form-urlencoded"
         }
                
-        response = requests.post(url, data=payload, headers=headers)
+        response = self.session.post(url, data=payload, headers=headers)
         response.raise_for_status()
                
         data = response.json()
         self.access_token = data.get("access_token")
         self.refresh_token = data.get("refresh_token")
+        self._auth_headers = None
        
         # Set token expiration (assuming expires_in is in seconds)
         expires_in = data.get("expires_in", 3600)
@@ -93,12 +120,13 @@ class IdovenAPIClient:
             "Content-Type": "application/x-www-form-urlencoded"
         }
        
-        response = requests.post(url, data=payload, headers=headers)
+        response = self.session.post(url, data=payload, headers=headers)
         response.raise_for_status()
        
         data = response.json()
         self.access_token = data.get("access_token")
         self.refresh_token = data.get("refresh_token", self.refresh_token)
+        self._auth_headers = None
        
         expires_in = data.get("expires_in", 3600)
         self.token_expires_at = time.time() + expires_in
@@ -117,9 +145,12 @@ class IdovenAPIClient:
             print("Token expired, refreshing...")
             self.refresh_access_token()
        
-        return {
-            "Authorization": f"Bearer {self.access_token}"
-        }
+        # Built once per token; authenticate/refresh invalidate the cache
+        if self._auth_headers is None:
+            self._auth_headers = {
+                "Authorization": f"Bearer {self.access_token}"
+            }
+        return self._auth_headers
    
     def upload_ecg(self, file_path: str, patient_id: Optional[str] = None) -> Dict:
         """
@@ -136,11 +167,6 @@ class IdovenAPIClient:
        
         headers = self._get_auth_headers()
        
-        # Prepare multipart form data
-        files = {
-            'file': (Path(file_path).name, open(file_path, 'rb'), 'application/octet-stream')
-        }
-       
         data = {
             'file': file_path,
             'model_name': 'hf',
@@ -151,7 +177,12 @@ class IdovenAPIClient:
         if patient_id:
             data['patient_id'] = patient_id
        
-        response = requests.post(url, headers=headers, files=files, data=data)
+        # Prepare multipart form data; the handle is closed even if the upload fails
+        with open(file_path, 'rb') as fh:
+            files = {
+                'file': (Path(file_path).name, fh, 'application/octet-stream')
+            }
+            response = self.session.post(url, headers=headers, files=files, data=data)
         response.raise_for_status()
        
         result = response.json()
@@ -162,6 +193,27 @@ class IdovenAPIClient:
        
         return result
    
+    def upload_many(self, file_paths: List[str], patient_id: Optional[str] = None,
+                    max_workers: int = 8) -> List[Dict]:
+        """
+        Upload several ECG files concurrently.
+       
+        Args:
+            file_paths: Paths to the SCP ECG files
+            patient_id: Optional patient identifier applied to every upload
+            max_workers: Maximum number of concurrent uploads
+           
+        Returns:
+            Upload responses in the same order as file_paths
+        """
+        # Refresh the token once up front rather than racing in the workers
+        self._get_auth_headers()
+       
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(
+                lambda path: self.upload_ecg(path, patient_id=patient_id),
+                file_paths))
+   
     def get_analysis_results(self, analysis_id: str) -> Dict:
         """
         Get analysis results as JSON.
@@ -176,10 +228,24 @@ class IdovenAPIClient:
        
         headers = self._get_auth_headers()
        
-        response = requests.get(url, headers=headers)
+        # Revalidate with the last ETag so unchanged results come back as 304
+        cached = self._analysis_cache.get(analysis_id)
+        if cached:
+            headers = {**headers, "If-None-Match": cached[0]}
+       
+        response = self.session.get(url, headers=headers)
         response.raise_for_status()
        
-        result = response.json()
+        if response.status_code == 304 and cached:
+            result = cached[1]
+        else:
+            result = response.json()
+            etag = response.headers.get("ETag")
+            if etag:
+                self._analysis_cache.pop(analysis_id, None)
+                if len(self._analysis_cache) >= self.ANALYSIS_CACHE_SIZE:
+                    del self._analysis_cache[next(iter(self._analysis_cache))]
+                self._analysis_cache[analysis_id] = (etag, result)
        
         print(f"✓ Analysis results retrieved")
         print(f"  Status: {result.get('status', 'N/A')}")
@@ -203,7 +269,7 @@ class IdovenAPIClient:
        
         # Get download link
         params = {"format": "pdf"}
-        response = requests.get(url, headers=headers, params=params)
+        response = self.session.get(url, headers=headers, params=params)
         response.raise_for_status()
        
         download_data = response.json()
@@ -215,26 +281,30 @@ class IdovenAPIClient:
         if not download_url:
             raise ValueError("No download URL in response")
        
-        # Download the PDF
-        pdf_response = requests.get(download_url)
-        pdf_response.raise_for_status()
-       
-        with open(output_path, 'wb') as f:
-            f.write(pdf_response.content)
+        # Stream the PDF straight to disk instead of buffering it in memory
+        with self.session.get(download_url, stream=True) as pdf_response:
+            pdf_response.raise_for_status()
+            pdf_response.raw.decode_content = True
+            with open(output_path, 'wb') as f:
+                shutil.copyfileobj(pdf_response.raw, f, 1 << 20)
        
         print(f"✓ PDF report downloaded to: {output_path}")
        
         return output_path
    
     def wait_for_analysis(self, analysis_id: str, max_wait: int = 300,
-                         poll_interval: int = 5) -> Dict:
+                         poll_interval: float = 1.5, max_poll_interval: float = 30,
+                         backoff: float = 1.6, jitter: float = 0.5) -> Dict:
         """
-        Poll for analysis completion.
+        Poll for analysis completion with exponential backoff.
        
         Args:
             analysis_id: The analysis ID to monitor
             max_wait: Maximum time to wait in seconds
-            poll_interval: Time between polls in seconds
+            poll_interval: Initial time between polls in seconds
+            max_poll_interval: Upper bound on the time between polls in seconds
+            backoff: Factor the poll interval grows by after each attempt
+            jitter: Maximum random delay in seconds added to each poll interval
            
         Returns:
             Final analysis results
@@ -242,28 +312,37 @@ class IdovenAPIClient:
         print(f"Waiting for analysis {analysis_id} to complete...")
        
         start_time = time.time()
-        while time.time() - start_time < max_wait:
-            try:
-                result = self.get_analysis_results(analysis_id)
-                status = result.get('status', '').lower()
+        attempt = 0
+        # However polling ends, nothing polls this analysis again
+        try:
+            while time.time() - start_time < max_wait:
+                try:
+                    result = self.get_analysis_results(analysis_id)
+                    status = result.get('status', '').lower()
                
-                if status in ['completed', 'success', 'done']:
-                    print(f"✓ Analysis completed!")
-                    return result
-                elif status in ['failed', 'error']:
-                    print(f"✗ Analysis failed")
-                    return result
-                else:
-                    print(f"  Status: {status} - waiting...")
-                    time.sleep(poll_interval)
-            except requests.exceptions.HTTPError as e:
-                if e.response.status_code == 404:
-                    print(f"  Analysis not found yet - waiting...")
-                    time.sleep(poll_interval)
-                else:
-                    raise
-       
-        raise TimeoutError(f"Analysis did not complete within {max_wait} seconds")
+                    if status in ['completed', 'success', 'done']:
+                        print(f"✓ Analysis completed!")
+                        return result
+                    elif status in ['failed', 'error']:
+                        print(f"✗ Analysis failed")
+                        return result
+                    else:
+                        print(f"  Status: {status} - waiting...")
+                except requests.exceptions.HTTPError as e:
+                    if e.response.status_code == 404:
+                        print(f"  Analysis not found yet - waiting...")
+                    else:
+                        raise
+           
+                delay = min(max_poll_interval, poll_interval * backoff ** attempt)
+                delay += random.uniform(0, jitter)
+                remaining = max_wait - (time.time() - start_time)
+                time.sleep(max(0, min(delay, remaining)))
+                attempt += 1
+       
+            raise TimeoutError(f"Analysis did not complete within {max_wait} seconds")
+        finally:
+            self._analysis_cache.pop(analysis_id, None)
 
 
 def main():
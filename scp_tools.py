@@ -18,6 +18,8 @@ Usage:
 import sys
 import os
 import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 # Add src to path
@@ -25,6 +27,10 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
 from src.scp_reader import SCPReader
 from src.scp_anonymizer import SCPAnonymizer
+from src.logging_config import (PROGRESS_LOGGER, start_progress_listener,
+                                init_progress_logging)
+
+progress = logging.getLogger(PROGRESS_LOGGER)
 
 
 def view_ecg(args):
@@ -103,6 +109,40 @@ def anonymize_file(args):
     return 0
 
 
+def _process_one(filepath, idx, anonymize, visualize, output_dir):
+    """Process a single file for batch mode (runs in a worker process)"""
+    name = os.path.basename(filepath)
+    stem = Path(filepath).stem
+    try:
+        if anonymize:
+            # Anonymize file
+            anon_id = f"ANON{idx:06d}"
+            anonymizer = SCPAnonymizer(filepath, anon_id)
+            output_path = os.path.join(output_dir, f"{anon_id}.SCP")
+            anonymizer.anonymize(output_path)
+            return idx, name, f"{anon_id}.SCP", "Anonymized"
+        
+        # Just copy and/or visualize
+        reader = SCPReader(filepath)
+        reader.read_file()
+        reader.close()
+        
+        if visualize:
+            import matplotlib
+            matplotlib.use('Agg')
+            import matplotlib.pyplot as plt
+            reader.visualize(paper_style=True, show=False)
+            output_path = os.path.join(output_dir, f"{stem}.png")
+            plt.savefig(output_path, dpi=150, bbox_inches='tight')
+            plt.close()
+            return idx, name, f"{stem}.png", "Visualized"
+        return idx, name, "", "Processed"
+        
+    except Exception as e:
+        progress.error(f"  Error processing {name}: {e}")
+        return idx, name, "", f"Error: {e}"
+
+
 def batch_process(args):
     """Process multiple files"""
     if not os.path.isdir(args.input_dir):
@@ -113,44 +153,37 @@ def batch_process(args):
     os.makedirs(args.output_dir, exist_ok=True)
     
     # Find all SCP files
-    scp_files = list(Path(args.input_dir).glob('*.SCP'))
+    scp_files = [entry.path for entry in os.scandir(args.input_dir)
+                 if entry.name.endswith('.SCP') and entry.is_file()]
     if not scp_files:
         print(f"No SCP files found in: {args.input_dir}")
         return 1
     
     print(f"Found {len(scp_files)} SCP files")
     
-    # Process each file
+    # Process files in parallel; each file is independent. Progress from
+    # all workers is printed by a single listener.
+    level = logging.WARNING if args.quiet else logging.INFO
+    queue, listener = start_progress_listener(level)
     results = []
-    for i, filepath in enumerate(scp_files, 1):
-        print(f"\n[{i}/{len(scp_files)}] Processing: {filepath.name}")
-        
-        try:
-            if args.anonymize:
-                # Anonymize file
-                anon_id = f"ANON{i:06d}"
-                anonymizer = SCPAnonymizer(str(filepath), anon_id)
-                output_path = os.path.join(args.output_dir, f"{anon_id}.SCP")
-                anonymizer.anonymize(output_path)
-                results.append((filepath.name, f"{anon_id}.SCP", "Anonymized"))
-            else:
-                # Just copy and/or visualize
-                reader = SCPReader(str(filepath))
-                reader.read_file()
-                
-                if args.visualize:
-                    import matplotlib.pyplot as plt
-                    reader.visualize(paper_style=True)
-                    output_path = os.path.join(args.output_dir, f"{filepath.stem}.png")
-                    plt.savefig(output_path, dpi=150, bbox_inches='tight')
-                    plt.close()
-                    results.append((filepath.name, f"{filepath.stem}.png", "Visualized"))
-                else:
-                    results.append((filepath.name, "", "Processed"))
-                    
-        except Exception as e:
-            print(f"  Error: {e}")
-            results.append((filepath.name, "", f"Error: {e}"))
+    try:
+        with ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                 initializer=init_progress_logging,
+                                 initargs=(queue, level)) as executor:
+            futures = [
+                executor.submit(_process_one, filepath, i,
+                                args.anonymize, args.visualize, args.output_dir)
+                for i, filepath in enumerate(scp_files, 1)
+            ]
+            for done, future in enumerate(as_completed(futures), 1):
+                i, original, output, status = future.result()
+                progress.info(f"[{done}/{len(scp_files)}] {original}: {status}")
+                results.append((i, original, output, status))
+    finally:
+        listener.stop()
+    
+    # Keep the summary in input order regardless of completion order
+    results = [result[1:] for result in sorted(results)]
     
     # Print summary
     print("\n" + "="*60)
@@ -165,12 +198,12 @@ def batch_process(args):
     # Save mapping file if anonymizing
     if args.anonymize:
         mapping_file = os.path.join(args.output_dir, "mapping.txt")
+        lines = ["Original File -> Anonymous ID", "-"*40]
+        lines.extend(f"{original} -> {output}"
+                     for original, output, status in results
+                     if status == "Anonymized")
         with open(mapping_file, 'w') as f:
-            f.write("Original File -> Anonymous ID\n")
-            f.write("-"*40 + "\n")
-            for original, output, status in results:
-                if status == "Anonymized":
-                    f.write(f"{original} -> {output}\n")
+            f.write("\n".join(lines) + "\n")
         print(f"\nMapping saved to: {mapping_file}")
     
     return 0
@@ -237,6 +270,8 @@ Examples:
                             help='Anonymize files')
     batch_parser.add_argument('--visualize', action='store_true',
                             help='Generate visualizations')
+    batch_parser.add_argument('--quiet', '-q', action='store_true',
+                            help='Only report errors while processing')
     
     # Parse arguments
     args = parser.parse_args()
@@ -46,6 +46,10 @@ setup(
             "black>=21.0",
             "flake8>=3.9.0",
         ],
+        "fast": [
+            "hyperscan>=0.4",
+            "pyahocorasick>=2.0",
+        ],
     },
     entry_points={
         "console_scripts": [
@@ -8,19 +8,131 @@ to ensure files are properly anonymized with no PHI leakage.
 Author: Farhad Abtahi
 """
 
+import mmap
 import struct
 import sys
 import os
 import re
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Tuple, Set
 from datetime import datetime
 
+# Precompiled little-endian unpackers for SCP headers and tag values
+_SECTION_HEADER = struct.Struct('<HI')  # section ID, section length
+_U16 = struct.Struct('<H')
+_TAG_HEADER = struct.Struct('<BH')  # tag, value length
+_DATE = struct.Struct('<HBB')  # year, month, day
+
+# PHI search patterns, compiled once at import time
+NAME_PATTERNS = tuple(re.compile(p, re.IGNORECASE) for p in (
+    rb'John', rb'Jane', rb'Smith', rb'Johnson', rb'Williams',
+    rb'Brown', rb'Jones', rb'Garcia', rb'Miller', rb'Davis',
+    rb'Rodriguez', rb'Martinez', rb'Hernandez', rb'Lopez',
+    rb'Dr\.?\s+[A-Z][a-z]+',  # Dr. Name
+    rb'[A-Z][a-z]+,\s*[A-Z][a-z]+',  # Last, First
+))
+
+DATE_PATTERNS = (
+    re.compile(rb'\d{1,2}/\d{1,2}/\d{2,4}'),  # MM/DD/YYYY
+    re.compile(rb'\d{4}-\d{2}-\d{2}'),  # YYYY-MM-DD
+    re.compile(rb'\d{2}-\d{2}-\d{4}'),  # DD-MM-YYYY
+)
+
+SSN_PATTERN = re.compile(rb'\d{3}-\d{2}-\d{4}')  # XXX-XX-XXXX
+
+# Bare and dashed forms must not be part of a longer digit run; those are
+# reported by the numeric ID check instead.
+PHONE_PATTERNS = (
+    re.compile(rb'\(\d{3}\)\s*\d{3}-\d{4}'),  # (XXX) XXX-XXXX
+    re.compile(rb'(?<!\d)\d{3}-\d{3}-\d{4}(?!\d)'),  # XXX-XXX-XXXX
+    re.compile(rb'(?<!\d)\d{10}(?!\d)'),  # XXXXXXXXXX
+)
+
+EMAIL_PATTERN = re.compile(rb'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+
+# Sequences of 8+ digits that might be patient IDs, MRNs, etc.
+# All-zero runs are placeholder IDs and are skipped by the lookahead.
+NUMERIC_ID_PATTERN = re.compile(rb'(?!0+(?!\d))\d{8,}')
+
+PHI_PATTERNS = {
+    'name': NAME_PATTERNS,
+    'date': DATE_PATTERNS,
+    'ssn': (SSN_PATTERN,),
+    'phone': PHONE_PATTERNS,
+    'email': (EMAIL_PATTERN,),
+    'numeric_id': (NUMERIC_ID_PATTERN,),
+}
+
+# Reference beat (5) and rhythm (6) sections hold raw ECG samples, which
+# often look like ASCII text by chance. They are left out of the textual
+# PHI scans; check_signal_data_unchanged compares them byte for byte with
+# the original when one is given. Without an original they go unchecked.
+SIGNAL_SECTIONS = (5, 6)
+
+# Every PHI pattern above only matches these bytes (4+ long), so matches
+# can only occur inside runs of them. The runs are a small fraction of a
+# binary SCP file.
+TEXT_RUN_PATTERN = re.compile(rb'[A-Za-z0-9._%+\-@/(),\s]{4,}')
+
+# Optional hyperscan prefilter (pip install scp-ecg-tools[fast]): one
+# multi-pattern scan tells which patterns match at all, so re only runs for
+# those. Most anonymized files match none. Hyperscan has no lookarounds, so
+# patterns using them are given as plain supersets.
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+_PHI_PATTERN_LIST = [pattern for patterns in PHI_PATTERNS.values() for pattern in patterns]
+_PREFILTER_SUPERSETS = {
+    NUMERIC_ID_PATTERN: rb'\d{8,}',
+    PHONE_PATTERNS[1]: rb'\d{3}-\d{3}-\d{4}',
+    PHONE_PATTERNS[2]: rb'\d{10}',
+}
+
+_PHI_PREFILTER = None
+if hyperscan is not None:
+    try:
+        _PHI_PREFILTER = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+        _PHI_PREFILTER.compile(
+            expressions=[_PREFILTER_SUPERSETS.get(pattern, pattern.pattern)
+                         for pattern in _PHI_PATTERN_LIST],
+            ids=list(range(len(_PHI_PATTERN_LIST))),
+            elements=len(_PHI_PATTERN_LIST),
+            flags=[(hyperscan.HS_FLAG_CASELESS if pattern.flags & re.IGNORECASE else 0)
+                   | hyperscan.HS_FLAG_SINGLEMATCH for pattern in _PHI_PATTERN_LIST],
+        )
+    except hyperscan.error:
+        # This hyperscan build rejects an expression; scan with re alone
+        _PHI_PREFILTER = None
+
+
+# Bytes dropped by decode('ascii', errors='ignore'), for deleting with bytes.translate
+_NON_ASCII = bytes(range(128, 256))
+
+
+def _is_all_zero(value: bytes) -> bool:
+    """True if value is empty or only NUL bytes (checked in C, not per byte)"""
+    return not value.lstrip(b'\x00')
+
+
 class AnonymizationVerifier:
     """
     Comprehensive verification tool for anonymized SCP-ECG files.
     Performs multiple levels of checks to ensure no PHI leakage.
     """
 
+    # Section 1 tags that must be anonymized, with their display names
+    TAG_NAMES = {
+        0: "Last name", 1: "First name", 2: "Patient ID",
+        5: "Date of birth", 6: "Last name", 7: "First name",
+        8: "Last name", 9: "First name", 10: "Date of birth",
+        21: "Physician name", 22: "Technician",
+        25: "Acquisition date", 26: "Acquisition time",
+        30: "Free text", 31: "Medical history"
+    }
+
     def __init__(self, filepath: str, original_filepath: str = None):
         """
         Initialize verifier.
@@ -36,488 +148,622 @@ class AnonymizationVerifier:
         self.issues = []
         self.warnings = []
         self.passed_checks = []
+        self._phi_hits = None
+        self._sections = []
+        self._section_index = {}
+        self._original_section_index = {}
+        self._output = []
+        self._current_year = datetime.now().year
+        self._size = 0
+
+    def _emit(self, line: str = ""):
+        """Queue a report line; verify_all writes the report in one call"""
+        self._output.append(line)
+
+    def _flush_output(self):
+        """Write all queued report lines to stdout"""
+        if self._output:
+            sys.stdout.write("\n".join(self._output) + "\n")
+            self._output = []
 
     def read_files(self):
-        """Read the SCP files into memory"""
-        with open(self.filepath, 'rb') as f:
-            self.data = f.read()
+        """Map the SCP files read-only (call close() when done)"""
+        self.data = self._map_file(self.filepath)
+        self._size = len(self.data)
+        self._phi_hits = None
+        self._sections, self._section_index = self._index_sections(self.data)
 
         if self.original_filepath and os.path.exists(self.original_filepath):
-            with open(self.original_filepath, 'rb') as f:
-                self.original_data = f.read()
+            self.original_data = self._map_file(self.original_filepath)
+            _, self._original_section_index = self._index_sections(self.original_data)
+
+    @staticmethod
+    def _map_file(path: str):
+        """Memory-map a file for reading; empty files cannot be mapped"""
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b''
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def _index_sections(data) -> Tuple[List[Tuple[int, int, int]], Dict[int, Tuple[int, int]]]:
+        """
+        Walk the SCP section headers once.
+
+        Returns:
+            Tuple of (sections, index): every header visited as
+            (id, offset, size) in file order, and the first (offset, size)
+            per section ID whose size fits in the file
+        """
+        sections = []
+        index = {}
+        pointer = 6
+        while pointer < len(data) - 16:
+            section_id, section_size = _SECTION_HEADER.unpack_from(data, pointer+2)
+            sections.append((section_id, pointer, section_size))
+
+            if section_size < len(data):
+                index.setdefault(section_id, (pointer, section_size))
 
-    def verify_all(self) -> bool:
+            if section_size > 0:
+                pointer += section_size
+            else:
+                break
+
+        return sections, index
+
+    def close(self):
+        """Release the file mappings created by read_files()"""
+        for data in (self.data, self.original_data):
+            if isinstance(data, mmap.mmap):
+                data.close()
+        self.data = None
+        self.original_data = None
+
+    def verify_all(self, quiet: bool = False) -> bool:
         """
         Run all verification checks.
 
+        Args:
+            quiet: Don't write the report to stdout
+
         Returns:
             True if all checks pass, False otherwise
         """
         self.read_files()
-
-        print(f"\nANONYMIZATION VERIFICATION REPORT")
-        print("=" * 70)
-        print(f"File: {os.path.basename(self.filepath)}")
-        print(f"Size: {len(self.data)} bytes")
-        print("=" * 70)
-
-        # Run all checks
-        self.check_section_1_tags()
-        self.check_for_real_names()
-        self.check_for_real_dates()
-        self.check_for_ssn_patterns()
-        self.check_for_phone_numbers()
-        self.check_for_email_addresses()
-        self.check_for_numeric_ids()
-        self.check_signal_data_unchanged()
-        self.check_file_structure()
-
-        # Print results
-        self._print_results()
+        try:
+            self._emit(f"\nANONYMIZATION VERIFICATION REPORT")
+            self._emit("=" * 70)
+            self._emit(f"File: {os.path.basename(self.filepath)}")
+            self._emit(f"Size: {self._size} bytes")
+            self._emit("=" * 70)
+
+            # Run all checks
+            self.check_section_1_tags()
+            self.check_for_real_names()
+            self.check_for_real_dates()
+            self.check_for_ssn_patterns()
+            self.check_for_phone_numbers()
+            self.check_for_email_addresses()
+            self.check_for_numeric_ids()
+            self.check_signal_data_unchanged()
+            self.check_file_structure()
+
+            # Print results
+            self._print_results()
+        finally:
+            if quiet:
+                self._output = []
+            else:
+                self._flush_output()
+            self.close()
 
         return len(self.issues) == 0
 
     def check_section_1_tags(self):
         """Verify all Section 1 tags are properly anonymized"""
-        print("\n1. SECTION 1 TAG VERIFICATION")
-        print("-" * 70)
-
-        # Find Section 1
-        pointer = 6
-        section_1_found = False
+        self._emit("\n1. SECTION 1 TAG VERIFICATION")
+        self._emit("-" * 70)
 
-        while pointer < len(self.data) - 16:
-            section_id = struct.unpack('<H', self.data[pointer+2:pointer+4])[0]
-            section_size = struct.unpack('<I', self.data[pointer+4:pointer+8])[0]
-
-            if section_id == 1 and section_size < len(self.data):
-                section_1_found = True
-                print(f"✓ Section 1 found at offset {pointer}, size {section_size}")
-
-                # Parse tags
-                tag_pointer = pointer + 16
-                end = pointer + section_size
-                tags_checked = 0
-
-                while tag_pointer < end - 3:
-                    tag = self.data[tag_pointer]
-                    if tag == 255:
-                        break
+        if 1 not in self._section_index:
+            self.issues.append("Section 1 not found in file")
+            self._emit("✗ Section 1 not found!")
+            return
 
-                    tag_length = struct.unpack('<H', self.data[tag_pointer+1:tag_pointer+3])[0]
-                    value = self.data[tag_pointer+3:tag_pointer+3+tag_length]
+        pointer, section_size = self._section_index[1]
+        self._emit(f"✓ Section 1 found at offset {pointer}, size {section_size}")
 
-                    self._verify_tag(tag, value)
-                    tags_checked += 1
-                    tag_pointer += 3 + tag_length
+        # Parse tags (a truncated file ends the section early)
+        tag_pointer = pointer + 16
+        end = min(pointer + section_size, self._size)
+        tags_checked = 0
 
-                print(f"✓ Checked {tags_checked} tags in Section 1")
-                self.passed_checks.append(f"Section 1: {tags_checked} tags verified")
+        while tag_pointer < end - 3:
+            tag, tag_length = _TAG_HEADER.unpack_from(self.data, tag_pointer)
+            if tag == 255:
                 break
 
-            if section_size > 0:
-                pointer += section_size
-            else:
-                break
+            # Only sensitive tags need their value copied out
+            if tag in self.TAG_NAMES:
+                self._verify_tag(tag, self.data[tag_pointer+3:tag_pointer+3+tag_length])
+            tags_checked += 1
+            tag_pointer += 3 + tag_length
 
-        if not section_1_found:
-            self.issues.append("Section 1 not found in file")
-            print("✗ Section 1 not found!")
+        self._emit(f"✓ Checked {tags_checked} tags in Section 1")
+        self.passed_checks.append(f"Section 1: {tags_checked} tags verified")
 
     def _verify_tag(self, tag: int, value: bytes):
         """Verify individual tag anonymization"""
-        tag_names = {
-            0: "Last name", 1: "First name", 2: "Patient ID",
-            5: "Date of birth", 6: "Last name", 7: "First name",
-            8: "Last name", 9: "First name", 10: "Date of birth",
-            21: "Physician name", 22: "Technician",
-            25: "Acquisition date", 26: "Acquisition time",
-            30: "Free text", 31: "Medical history"
-        }
-
-        if tag not in tag_names:
+        handler = self._TAG_HANDLERS.get(tag)
+        if handler is None:
             return  # Not a sensitive tag
 
-        tag_name = tag_names[tag]
+        handler(self, tag, self.TAG_NAMES[tag], value)
 
-        # Check patient ID (tag 2)
-        if tag == 2:
-            id_str = value.decode('ascii', errors='ignore').rstrip('\x00')
-            # Accept ANON, TEST, STUDY, IDOVEN, or empty as valid anonymized IDs
-            if id_str.startswith('ANON') or id_str.startswith('TEST') or id_str.startswith('STUDY') or id_str.startswith('IDOVEN') or len(id_str) == 0:
-                print(f"  ✓ Tag {tag} ({tag_name}): '{id_str}' - properly anonymized")
+    def _check_patient_id(self, tag: int, tag_name: str, value: bytes):
+        """Check patient ID (tag 2)"""
+        id_str = value.decode('ascii', errors='ignore').rstrip('\x00')
+        # Accept ANON, TEST, STUDY, IDOVEN, or empty as valid anonymized IDs
+        if id_str.startswith('ANON') or id_str.startswith('TEST') or id_str.startswith('STUDY') or id_str.startswith('IDOVEN') or len(id_str) == 0:
+            self._emit(f"  ✓ Tag {tag} ({tag_name}): '{id_str}' - properly anonymized")
+        else:
+            self.issues.append(f"Tag {tag} ({tag_name}): contains real ID '{id_str}'")
+            self._emit(f"  ✗ Tag {tag} ({tag_name}): REAL ID FOUND: '{id_str}'")
+
+    def _check_name(self, tag: int, tag_name: str, value: bytes):
+        """Check names (tags 0, 1, 6, 7, 8, 9)"""
+        # Work on the ASCII bytes; only decode for messages
+        name = value.translate(None, _NON_ASCII).rstrip(b'\x00')
+        # Check if field is properly anonymized
+        if b'REMOVED' in name or name == b'REMOVE' or name == b'REM' or name == b'R' or len(name) == 0 or _is_all_zero(value):
+            self._emit(f"  ✓ Tag {tag} ({tag_name}): properly anonymized")
+        else:
+            name_str = name.decode('ascii')
+            # Check if it looks like a real name (excluding our anonymization markers)
+            if len(name) > 2 and name.isalpha() and name not in (b'REMOVE', b'REMOVED', b'REM'):
+                self.issues.append(f"Tag {tag} ({tag_name}): possible real name '{name_str}'")
+                self._emit(f"  ✗ Tag {tag} ({tag_name}): POSSIBLE REAL NAME: '{name_str}'")
             else:
-                self.issues.append(f"Tag {tag} ({tag_name}): contains real ID '{id_str}'")
-                print(f"  ✗ Tag {tag} ({tag_name}): REAL ID FOUND: '{id_str}'")
-
-        # Check names (tags 0, 1, 6, 7, 8, 9)
-        elif tag in [0, 1, 6, 7, 8, 9]:
-            name_str = value.decode('ascii', errors='ignore').rstrip('\x00')
-            # Check if field is properly anonymized
-            if 'REMOVED' in name_str or name_str == 'REMOVE' or name_str == 'REM' or name_str == 'R' or len(name_str) == 0 or all(b == 0 for b in value):
-                print(f"  ✓ Tag {tag} ({tag_name}): properly anonymized")
+                self.warnings.append(f"Tag {tag} ({tag_name}): unusual value '{name_str}'")
+
+    def _check_dob(self, tag: int, tag_name: str, value: bytes):
+        """Check date of birth (tags 5, 10)"""
+        if len(value) >= 4:
+            # Try little-endian first (SCP standard)
+            year, month, day = _DATE.unpack_from(value)
+
+            if year == 1900 and month == 1 and day == 1:
+                self._emit(f"  ✓ Tag {tag} ({tag_name}): {year}-{month:02d}-{day:02d} - anonymized")
             else:
-                # Check if it looks like a real name (excluding our anonymization markers)
-                if len(name_str) > 2 and name_str.isalpha() and name_str not in ['REMOVE', 'REMOVED', 'REM']:
-                    self.issues.append(f"Tag {tag} ({tag_name}): possible real name '{name_str}'")
-                    print(f"  ✗ Tag {tag} ({tag_name}): POSSIBLE REAL NAME: '{name_str}'")
-                else:
-                    self.warnings.append(f"Tag {tag} ({tag_name}): unusual value '{name_str}'")
-
-        # Check date of birth (tags 5, 10)
-        elif tag in [5, 10]:
-            if len(value) >= 4:
-                # Try little-endian first (SCP standard)
-                year = struct.unpack('<H', value[0:2])[0]
-                month = value[2]
-                day = value[3]
-
-                if year == 1900 and month == 1 and day == 1:
-                    print(f"  ✓ Tag {tag} ({tag_name}): {year}-{month:02d}-{day:02d} - anonymized")
-                else:
-                    current_year = datetime.now().year
-                    if 1900 <= year <= current_year:
-                        self.issues.append(f"Tag {tag} ({tag_name}): real DOB {year}-{month:02d}-{day:02d}")
-                        print(f"  ✗ Tag {tag} ({tag_name}): REAL DOB: {year}-{month:02d}-{day:02d}")
-
-        # Check acquisition date (tag 25)
-        elif tag == 25:
-            if len(value) >= 4:
-                # Try little-endian first (SCP standard)
-                year = struct.unpack('<H', value[0:2])[0]
-                month = value[2]
-                day = value[3]
-
-                if year == 2000 and month == 1 and day == 1:
-                    print(f"  ✓ Tag {tag} ({tag_name}): {year}-{month:02d}-{day:02d} - anonymized")
-                else:
-                    self.warnings.append(f"Tag {tag} ({tag_name}): non-standard date {year}-{month:02d}-{day:02d}")
-                    print(f"  ⚠ Tag {tag} ({tag_name}): Non-standard date {year}-{month:02d}-{day:02d}")
-
-        # Check acquisition time (tag 26)
-        elif tag == 26:
-            if len(value) >= 3:
-                hour = value[0]
-                minute = value[1]
-                second = value[2]
-
-                # Accept both 00:00:00 and 12:00:00 as valid anonymized times
-                if (hour == 0 or hour == 12) and minute == 0 and second == 0:
-                    print(f"  ✓ Tag {tag} ({tag_name}): {hour:02d}:{minute:02d}:{second:02d} - anonymized")
-                else:
-                    self.warnings.append(f"Tag {tag} ({tag_name}): non-standard time {hour:02d}:{minute:02d}:{second:02d}")
-                    print(f"  ⚠ Tag {tag} ({tag_name}): Non-standard time {hour:02d}:{minute:02d}:{second:02d}")
-
-        # Check physician/technician (tags 21, 22)
-        elif tag in [21, 22]:
-            if all(b == 0 for b in value):
-                print(f"  ✓ Tag {tag} ({tag_name}): properly zeroed")
+                if 1900 <= year <= self._current_year:
+                    self.issues.append(f"Tag {tag} ({tag_name}): real DOB {year}-{month:02d}-{day:02d}")
+                    self._emit(f"  ✗ Tag {tag} ({tag_name}): REAL DOB: {year}-{month:02d}-{day:02d}")
+
+    def _check_acquisition_date(self, tag: int, tag_name: str, value: bytes):
+        """Check acquisition date (tag 25)"""
+        if len(value) >= 4:
+            # Try little-endian first (SCP standard)
+            year, month, day = _DATE.unpack_from(value)
+
+            if year == 2000 and month == 1 and day == 1:
+                self._emit(f"  ✓ Tag {tag} ({tag_name}): {year}-{month:02d}-{day:02d} - anonymized")
             else:
-                text = value.decode('ascii', errors='ignore').rstrip('\x00')
-                if len(text) > 0:
-                    self.issues.append(f"Tag {tag} ({tag_name}): contains text '{text}'")
-                    print(f"  ✗ Tag {tag} ({tag_name}): CONTAINS TEXT: '{text}'")
-
-        # Check free text and medical history (tags 30, 31)
-        elif tag in [30, 31]:
-            if all(b == 0 for b in value):
-                print(f"  ✓ Tag {tag} ({tag_name}): properly zeroed")
+                self.warnings.append(f"Tag {tag} ({tag_name}): non-standard date {year}-{month:02d}-{day:02d}")
+                self._emit(f"  ⚠ Tag {tag} ({tag_name}): Non-standard date {year}-{month:02d}-{day:02d}")
+
+    def _check_acquisition_time(self, tag: int, tag_name: str, value: bytes):
+        """Check acquisition time (tag 26)"""
+        if len(value) >= 3:
+            hour = value[0]
+            minute = value[1]
+            second = value[2]
+
+            # Accept both 00:00:00 and 12:00:00 as valid anonymized times
+            if (hour == 0 or hour == 12) and minute == 0 and second == 0:
+                self._emit(f"  ✓ Tag {tag} ({tag_name}): {hour:02d}:{minute:02d}:{second:02d} - anonymized")
             else:
-                text = value.decode('ascii', errors='ignore').rstrip('\x00')
-                if len(text) > 0:
-                    self.warnings.append(f"Tag {tag} ({tag_name}): contains data (may be intentional)")
-                    print(f"  ⚠ Tag {tag} ({tag_name}): Contains data (length {len(text)})")
+                self.warnings.append(f"Tag {tag} ({tag_name}): non-standard time {hour:02d}:{minute:02d}:{second:02d}")
+                self._emit(f"  ⚠ Tag {tag} ({tag_name}): Non-standard time {hour:02d}:{minute:02d}:{second:02d}")
+
+    def _check_personnel(self, tag: int, tag_name: str, value: bytes):
+        """Check physician/technician (tags 21, 22)"""
+        if _is_all_zero(value):
+            self._emit(f"  ✓ Tag {tag} ({tag_name}): properly zeroed")
+        else:
+            text = value.decode('ascii', errors='ignore').rstrip('\x00')
+            if len(text) > 0:
+                self.issues.append(f"Tag {tag} ({tag_name}): contains text '{text}'")
+                self._emit(f"  ✗ Tag {tag} ({tag_name}): CONTAINS TEXT: '{text}'")
+
+    def _check_free_text(self, tag: int, tag_name: str, value: bytes):
+        """Check free text and medical history (tags 30, 31)"""
+        if _is_all_zero(value):
+            self._emit(f"  ✓ Tag {tag} ({tag_name}): properly zeroed")
+        else:
+            text = value.decode('ascii', errors='ignore').rstrip('\x00')
+            if len(text) > 0:
+                self.warnings.append(f"Tag {tag} ({tag_name}): contains data (may be intentional)")
+                self._emit(f"  ⚠ Tag {tag} ({tag_name}): Contains data (length {len(text)})")
+
+    # Handler per sensitive tag, used by _verify_tag
+    _TAG_HANDLERS = {
+        2: _check_patient_id,
+        0: _check_name, 1: _check_name, 6: _check_name,
+        7: _check_name, 8: _check_name, 9: _check_name,
+        5: _check_dob, 10: _check_dob,
+        25: _check_acquisition_date,
+        26: _check_acquisition_time,
+        21: _check_personnel, 22: _check_personnel,
+        30: _check_free_text, 31: _check_free_text,
+    }
+
+    def _text_regions(self) -> List[Tuple[int, int]]:
+        """
+        Byte ranges of the file outside well-formed signal sections.
+
+        Returns:
+            List of (start, end) offsets covering everything except
+            SIGNAL_SECTIONS payloads, in file order
+        """
+        excluded = sorted((offset, offset + size) for section_id, offset, size in self._sections
+                          if section_id in SIGNAL_SECTIONS
+                          and 0 < size <= self._size - offset)
+
+        regions = []
+        start = 0
+        for section_start, section_end in excluded:
+            if section_start > start:
+                regions.append((start, section_start))
+            start = max(start, section_end)
+        if start < self._size:
+            regions.append((start, self._size))
+
+        return regions
+
+    def _scan_phi(self) -> Dict[str, List[Tuple[int, bytes]]]:
+        """
+        Find all PHI pattern matches in one pass over the file's text regions
+        (everything but the signal sample sections).
+
+        The text runs are joined with NUL separators (no pattern matches a
+        NUL) so each pattern searches them with a single call, and match
+        positions are mapped back to file offsets. Per-pattern order and
+        overlapping hits are the same as searching self.data directly.
+
+        Returns:
+            Dict mapping PHI category to a list of (offset, match) tuples
+        """
+        if self._phi_hits is not None:
+            return self._phi_hits
+
+        run_starts = []
+        file_offsets = []
+        runs = []
+        position = 0
+        for start, end in self._text_regions():
+            for match in TEXT_RUN_PATTERN.finditer(self.data, start, end):
+                run_starts.append(position)
+                file_offsets.append(match.start())
+                runs.append(match.group())
+                position += len(runs[-1]) + 1
+        text = b'\x00'.join(runs)
+
+        candidates = None
+        if _PHI_PREFILTER is not None and text:
+            candidates = set()
+            _PHI_PREFILTER.scan(text, match_event_handler=lambda pattern_id, *_: candidates.add(
+                _PHI_PATTERN_LIST[pattern_id]))
+
+        self._phi_hits = {}
+        for category, patterns in PHI_PATTERNS.items():
+            hits = []
+            for pattern in patterns:
+                if candidates is not None and pattern not in candidates:
+                    continue
+                for match in pattern.finditer(text):
+                    i = bisect_right(run_starts, match.start()) - 1
+                    offset = file_offsets[i] + match.start() - run_starts[i]
+                    hits.append((offset, match.group()))
+            self._phi_hits[category] = hits
+
+        return self._phi_hits
 
     def check_for_real_names(self):
         """Search for common name patterns in the entire file"""
-        print("\n2. REAL NAME PATTERN SEARCH")
-        print("-" * 70)
-
-        # Common name patterns (case-insensitive)
-        name_patterns = [
-            rb'John', rb'Jane', rb'Smith', rb'Johnson', rb'Williams',
-            rb'Brown', rb'Jones', rb'Garcia', rb'Miller', rb'Davis',
-            rb'Rodriguez', rb'Martinez', rb'Hernandez', rb'Lopez',
-            rb'Dr\.?\s+[A-Z][a-z]+',  # Dr. Name
-            rb'[A-Z][a-z]+,\s*[A-Z][a-z]+',  # Last, First
-        ]
+        self._emit("\n2. REAL NAME PATTERN SEARCH")
+        self._emit("-" * 70)
 
         found_names = []
-        for pattern in name_patterns:
-            matches = re.finditer(pattern, self.data, re.IGNORECASE)
-            for match in matches:
-                context = self.data[max(0, match.start()-10):match.end()+10]
-                found_names.append((match.group(), match.start(), context))
+        for offset, name in self._scan_phi()['name']:
+            context = self.data[max(0, offset-10):offset+len(name)+10]
+            found_names.append((name, offset, context))
 
         if found_names:
-            print(f"✗ Found {len(found_names)} potential name pattern(s):")
+            self._emit(f"✗ Found {len(found_names)} potential name pattern(s):")
             for name, offset, context in found_names[:5]:  # Show first 5
                 self.issues.append(f"Possible name at offset {offset}: {name.decode('ascii', errors='ignore')}")
-                print(f"  Offset {offset}: {name.decode('ascii', errors='ignore')}")
+                self._emit(f"  Offset {offset}: {name.decode('ascii', errors='ignore')}")
         else:
-            print("✓ No common name patterns found")
+            self._emit("✓ No common name patterns found")
             self.passed_checks.append("No name patterns detected")
 
     def check_for_real_dates(self):
         """Search for date patterns that might indicate real dates"""
-        print("\n3. REAL DATE PATTERN SEARCH")
-        print("-" * 70)
-
-        # Look for dates in various formats
-        date_patterns = [
-            rb'\d{1,2}/\d{1,2}/\d{2,4}',  # MM/DD/YYYY
-            rb'\d{4}-\d{2}-\d{2}',  # YYYY-MM-DD
-            rb'\d{2}-\d{2}-\d{4}',  # DD-MM-YYYY
-        ]
-
-        found_dates = []
-        for pattern in date_patterns:
-            matches = re.finditer(pattern, self.data)
-            for match in matches:
-                found_dates.append((match.group(), match.start()))
+        self._emit("\n3. REAL DATE PATTERN SEARCH")
+        self._emit("-" * 70)
+
+        found_dates = [(date, offset) for offset, date in self._scan_phi()['date']]
 
         if found_dates:
-            print(f"⚠ Found {len(found_dates)} date-like pattern(s):")
+            self._emit(f"⚠ Found {len(found_dates)} date-like pattern(s):")
             for date, offset in found_dates[:5]:
                 self.warnings.append(f"Date pattern at offset {offset}: {date.decode('ascii', errors='ignore')}")
-                print(f"  Offset {offset}: {date.decode('ascii', errors='ignore')}")
+                self._emit(f"  Offset {offset}: {date.decode('ascii', errors='ignore')}")
         else:
-            print("✓ No text date patterns found")
+            self._emit("✓ No text date patterns found")
             self.passed_checks.append("No text date patterns detected")
 
     def check_for_ssn_patterns(self):
         """Search for Social Security Number patterns"""
-        print("\n4. SSN PATTERN SEARCH")
-        print("-" * 70)
+        self._emit("\n4. SSN PATTERN SEARCH")
+        self._emit("-" * 70)
 
-        # SSN patterns: XXX-XX-XXXX
-        ssn_pattern = rb'\d{3}-\d{2}-\d{4}'
-        matches = list(re.finditer(ssn_pattern, self.data))
+        matches = self._scan_phi()['ssn']
 
         if matches:
-            print(f"✗ Found {len(matches)} SSN-like pattern(s):")
-            for match in matches[:3]:
-                self.issues.append(f"SSN pattern at offset {match.start()}: {match.group().decode('ascii')}")
-                print(f"  Offset {match.start()}: {match.group().decode('ascii')}")
+            self._emit(f"✗ Found {len(matches)} SSN-like pattern(s):")
+            for offset, ssn in matches[:3]:
+                self.issues.append(f"SSN pattern at offset {offset}: {ssn.decode('ascii')}")
+                self._emit(f"  Offset {offset}: {ssn.decode('ascii')}")
         else:
-            print("✓ No SSN patterns found")
+            self._emit("✓ No SSN patterns found")
             self.passed_checks.append("No SSN patterns detected")
 
     def check_for_phone_numbers(self):
         """Search for phone number patterns"""
-        print("\n5. PHONE NUMBER PATTERN SEARCH")
-        print("-" * 70)
-
-        # Phone patterns
-        phone_patterns = [
-            rb'\(\d{3}\)\s*\d{3}-\d{4}',  # (XXX) XXX-XXXX
-            rb'\d{3}-\d{3}-\d{4}',  # XXX-XXX-XXXX
-            rb'\d{10}',  # XXXXXXXXXX
-        ]
-
-        found_phones = []
-        for pattern in phone_patterns:
-            matches = re.finditer(pattern, self.data)
-            for match in matches:
-                # Verify it's actually phone-like (not just random 10 digits)
-                if len(match.group()) == 10 or b'-' in match.group() or b'(' in match.group():
-                    found_phones.append((match.group(), match.start()))
+        self._emit("\n5. PHONE NUMBER PATTERN SEARCH")
+        self._emit("-" * 70)
+
+        found_phones = [(phone, offset) for offset, phone in self._scan_phi()['phone']]
 
         if found_phones:
-            print(f"⚠ Found {len(found_phones)} phone-like pattern(s):")
+            self._emit(f"⚠ Found {len(found_phones)} phone-like pattern(s):")
             for phone, offset in found_phones[:3]:
                 self.warnings.append(f"Phone pattern at offset {offset}: {phone.decode('ascii', errors='ignore')}")
-                print(f"  Offset {offset}: {phone.decode('ascii', errors='ignore')}")
+                self._emit(f"  Offset {offset}: {phone.decode('ascii', errors='ignore')}")
         else:
-            print("✓ No phone number patterns found")
+            self._emit("✓ No phone number patterns found")
             self.passed_checks.append("No phone patterns detected")
 
     def check_for_email_addresses(self):
         """Search for email address patterns"""
-        print("\n6. EMAIL ADDRESS PATTERN SEARCH")
-        print("-" * 70)
+        self._emit("\n6. EMAIL ADDRESS PATTERN SEARCH")
+        self._emit("-" * 70)
 
-        email_pattern = rb'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-        matches = list(re.finditer(email_pattern, self.data))
+        matches = self._scan_phi()['email']
 
         if matches:
-            print(f"✗ Found {len(matches)} email-like pattern(s):")
-            for match in matches[:3]:
-                self.issues.append(f"Email at offset {match.start()}: {match.group().decode('ascii', errors='ignore')}")
-                print(f"  Offset {match.start()}: {match.group().decode('ascii', errors='ignore')}")
+            self._emit(f"✗ Found {len(matches)} email-like pattern(s):")
+            for offset, email in matches[:3]:
+                self.issues.append(f"Email at offset {offset}: {email.decode('ascii', errors='ignore')}")
+                self._emit(f"  Offset {offset}: {email.decode('ascii', errors='ignore')}")
         else:
-            print("✓ No email addresses found")
+            self._emit("✓ No email addresses found")
             self.passed_checks.append("No email patterns detected")
 
     def check_for_numeric_ids(self):
         """Search for long numeric sequences that might be IDs"""
-        print("\n7. NUMERIC ID PATTERN SEARCH")
-        print("-" * 70)
+        self._emit("\n7. NUMERIC ID PATTERN SEARCH")
+        self._emit("-" * 70)
 
-        # Look for sequences of 8+ digits that might be patient IDs, MRNs, etc.
-        id_pattern = rb'\d{8,}'
-        matches = list(re.finditer(id_pattern, self.data))
-
-        # Filter out known anonymized IDs
-        suspicious_ids = []
-        for match in matches:
-            id_str = match.group().decode('ascii')
-            # Skip if it starts with ANON or is all zeros
-            if not (id_str.startswith('ANON') or id_str == '0' * len(id_str)):
-                suspicious_ids.append((id_str, match.start()))
+        suspicious_ids = [(id_bytes.decode('ascii'), offset)
+                          for offset, id_bytes in self._scan_phi()['numeric_id']]
 
         if suspicious_ids:
-            print(f"⚠ Found {len(suspicious_ids)} long numeric sequence(s):")
+            self._emit(f"⚠ Found {len(suspicious_ids)} long numeric sequence(s):")
             for id_str, offset in suspicious_ids[:5]:
                 self.warnings.append(f"Numeric ID at offset {offset}: {id_str}")
-                print(f"  Offset {offset}: {id_str}")
+                self._emit(f"  Offset {offset}: {id_str}")
         else:
-            print("✓ No suspicious numeric IDs found")
+            self._emit("✓ No suspicious numeric IDs found")
             self.passed_checks.append("No suspicious numeric IDs detected")
 
     def check_signal_data_unchanged(self):
-        """Verify ECG signal data is unchanged (Sections 3 and 6)"""
-        print("\n8. SIGNAL DATA INTEGRITY CHECK")
-        print("-" * 70)
+        """Verify ECG signal data is unchanged (Sections 3, 5 and 6)"""
+        self._emit("\n8. SIGNAL DATA INTEGRITY CHECK")
+        self._emit("-" * 70)
 
         if not self.original_data:
-            print("⚠ Original file not provided - skipping comparison")
+            self._emit("⚠ Original file not provided - skipping comparison")
             return
 
-        # Find and compare Section 3 (Lead definitions)
-        section_3_match = self._compare_section(3, "Lead definitions")
-        section_6_match = self._compare_section(6, "Rhythm data")
+        # Section 3 (Lead definitions) plus the sample sections the PHI
+        # scans skip
+        matches = {
+            3: self._compare_section(3, "Lead definitions"),
+            5: self._compare_section(5, "Reference beats"),
+            6: self._compare_section(6, "Rhythm data"),
+        }
+        preserved = [str(section_id) for section_id, match in matches.items() if match]
+        inconclusive = [str(section_id) for section_id, match in matches.items() if not match]
 
-        if section_3_match and section_6_match:
-            print("✓ Signal data (Sections 3 and 6) byte-identical to original")
+        if not inconclusive:
+            self._emit("✓ Signal data (Sections 3, 5 and 6) byte-identical to original")
             self.passed_checks.append("Signal data preserved (100% identical)")
-        elif section_3_match:
-            print("✓ Section 3 preserved, Section 6 check inconclusive")
-        elif section_6_match:
-            print("✓ Section 6 preserved, Section 3 check inconclusive")
+        elif preserved:
+            self._emit(f"✓ Section {', '.join(preserved)} preserved, "
+                       f"Section {', '.join(inconclusive)} check inconclusive")
 
     def _compare_section(self, section_id: int, section_name: str) -> bool:
         """Compare a specific section between original and anonymized"""
-        # Find section in both files
-        orig_section = self._find_section(self.original_data, section_id)
-        anon_section = self._find_section(self.data, section_id)
-
-        if orig_section and anon_section:
-            if orig_section == anon_section:
-                print(f"  ✓ Section {section_id} ({section_name}): byte-identical")
+        orig_length = self._section_length(self.original_data, self._original_section_index, section_id)
+        anon_length = self._section_length(self.data, self._section_index, section_id)
+
+        if orig_length and anon_length:
+            # Only copy the sections out of the file maps if they can be equal
+            if orig_length == anon_length and (
+                    self._find_section(self.original_data, self._original_section_index, section_id)
+                    == self._find_section(self.data, self._section_index, section_id)):
+                self._emit(f"  ✓ Section {section_id} ({section_name}): byte-identical")
                 return True
             else:
                 self.issues.append(f"Section {section_id} ({section_name}): modified!")
-                print(f"  ✗ Section {section_id} ({section_name}): MODIFIED!")
+                self._emit(f"  ✗ Section {section_id} ({section_name}): MODIFIED!")
                 return False
-        elif not orig_section:
-            print(f"  ⚠ Section {section_id} not found in original")
-        elif not anon_section:
-            print(f"  ⚠ Section {section_id} not found in anonymized")
+        elif not orig_length:
+            self._emit(f"  ⚠ Section {section_id} not found in original")
+        elif not anon_length:
+            self._emit(f"  ⚠ Section {section_id} not found in anonymized")
 
         return False
 
-    def _find_section(self, data: bytes, section_id: int) -> bytes:
-        """Find and extract a specific section from SCP data"""
-        pointer = 6
-        while pointer < len(data) - 16:
-            sid = struct.unpack('<H', data[pointer+2:pointer+4])[0]
-            size = struct.unpack('<I', data[pointer+4:pointer+8])[0]
+    @staticmethod
+    def _section_length(data: bytes, index: Dict[int, Tuple[int, int]], section_id: int) -> int:
+        """Length of the bytes _find_section would return (0 if not found)"""
+        if section_id not in index:
+            return 0
 
-            if sid == section_id and size < len(data):
-                return data[pointer:pointer+size]
+        pointer, size = index[section_id]
+        return min(size, len(data) - pointer)
 
-            if size > 0:
-                pointer += size
-            else:
-                break
+    def _find_section(self, data: bytes, index: Dict[int, Tuple[int, int]], section_id: int) -> bytes:
+        """Extract a specific section from SCP data using its section index"""
+        if section_id not in index:
+            return None
 
-        return None
+        pointer, size = index[section_id]
+        return data[pointer:pointer+size]
 
     def check_file_structure(self):
         """Verify file structure integrity"""
-        print("\n9. FILE STRUCTURE INTEGRITY")
-        print("-" * 70)
+        self._emit("\n9. FILE STRUCTURE INTEGRITY")
+        self._emit("-" * 70)
 
         # Check file size
-        if self.original_data and len(self.data) == len(self.original_data):
-            print(f"✓ File size unchanged: {len(self.data)} bytes")
+        if self.original_data and self._size == len(self.original_data):
+            self._emit(f"✓ File size unchanged: {self._size} bytes")
             self.passed_checks.append("File size preserved")
         elif self.original_data:
-            size_diff = len(self.data) - len(self.original_data)
+            size_diff = self._size - len(self.original_data)
             self.warnings.append(f"File size changed by {size_diff} bytes")
-            print(f"⚠ File size changed by {size_diff} bytes")
+            self._emit(f"⚠ File size changed by {size_diff} bytes")
 
         # Check CRCs
-        file_crc = struct.unpack('<H', self.data[0:2])[0]
-        print(f"✓ File CRC: 0x{file_crc:04X}")
-
-        # Count sections
-        pointer = 6
-        section_count = 0
-        while pointer < len(self.data) - 16:
-            section_id = struct.unpack('<H', self.data[pointer+2:pointer+4])[0]
-            section_size = struct.unpack('<I', self.data[pointer+4:pointer+8])[0]
-
-            if section_size == 0 or section_size > len(self.data) - pointer:
-                break
+        file_crc = _U16.unpack_from(self.data)[0]
+        self._emit(f"✓ File CRC: 0x{file_crc:04X}")
 
-            section_count += 1
-            pointer += section_size
+        # Count sections (the walk ends at a zero or oversized length)
+        section_count = sum(1 for _, pointer, section_size in self._sections
+                            if 0 < section_size <= self._size - pointer)
 
-        print(f"✓ Found {section_count} sections")
+        self._emit(f"✓ Found {section_count} sections")
         self.passed_checks.append(f"{section_count} sections validated")
 
     def _print_results(self):
         """Print summary of verification results"""
-        print("\n" + "=" * 70)
-        print("VERIFICATION SUMMARY")
-        print("=" * 70)
+        self._emit("\n" + "=" * 70)
+        self._emit("VERIFICATION SUMMARY")
+        self._emit("=" * 70)
 
-        print(f"\n✓ Passed Checks: {len(self.passed_checks)}")
+        self._emit(f"\n✓ Passed Checks: {len(self.passed_checks)}")
         for check in self.passed_checks:
-            print(f"  - {check}")
+            self._emit(f"  - {check}")
 
         if self.warnings:
-            print(f"\n⚠ Warnings: {len(self.warnings)}")
+            self._emit(f"\n⚠ Warnings: {len(self.warnings)}")
             for warning in self.warnings[:10]:  # Show first 10
-                print(f"  - {warning}")
+                self._emit(f"  - {warning}")
             if len(self.warnings) > 10:
-                print(f"  ... and {len(self.warnings) - 10} more")
+                self._emit(f"  ... and {len(self.warnings) - 10} more")
 
         if self.issues:
-            print(f"\n✗ ISSUES FOUND: {len(self.issues)}")
+            self._emit(f"\n✗ ISSUES FOUND: {len(self.issues)}")
             for issue in self.issues:
-                print(f"  - {issue}")
-            print("\n" + "=" * 70)
-            print("STATUS: ✗ VERIFICATION FAILED")
-            print("=" * 70)
-            print("⚠ PHI LEAKAGE DETECTED - FILE NOT SAFE FOR SHARING")
+                self._emit(f"  - {issue}")
+            self._emit("\n" + "=" * 70)
+            self._emit("STATUS: ✗ VERIFICATION FAILED")
+            self._emit("=" * 70)
+            self._emit("⚠ PHI LEAKAGE DETECTED - FILE NOT SAFE FOR SHARING")
         else:
-            print("\n" + "=" * 70)
-            print("STATUS: ✓ VERIFICATION PASSED")
-            print("=" * 70)
+            self._emit("\n" + "=" * 70)
+            self._emit("STATUS: ✓ VERIFICATION PASSED")
+            self._emit("=" * 70)
             if self.warnings:
-                print("⚠ Some warnings detected - review recommended")
+                self._emit("⚠ Some warnings detected - review recommended")
             else:
-                print("✓ File appears properly anonymized")
+                self._emit("✓ File appears properly anonymized")
+
+        self._emit()
+
+
+def _verify_one(filepath: str, original_filepath: str = None) -> Tuple[str, bool, List[str], List[str]]:
+    """Verify one file without printing its report (runs in a worker process)"""
+    verifier = AnonymizationVerifier(filepath, original_filepath)
+    passed = verifier.verify_all(quiet=True)
+    return filepath, passed, verifier.issues, verifier.warnings
+
 
-        print()
+def verify_many(paths: List[str], originals: List[str] = None,
+                max_workers: int = None) -> List[Tuple[str, bool, List[str], List[str]]]:
+    """
+    Verify several anonymized files in parallel, one process per CPU.
+
+    Args:
+        paths: Anonymized SCP files
+        originals: Optional original files, in the same order as paths
+        max_workers: Number of worker processes (default: CPU count)
+
+    Returns:
+        List of (path, passed, issues, warnings) in the order of paths
+    """
+    if originals is None:
+        originals = [None] * len(paths)
+
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        return list(executor.map(_verify_one, paths, originals))
+
+
+def _print_batch_results(results: List[Tuple[str, bool, List[str], List[str]]]):
+    """Print a one-line verdict per file and a batch summary"""
+    print(f"\nANONYMIZATION VERIFICATION: {len(results)} files")
+    print("=" * 70)
+    for filepath, passed, issues, warnings in results:
+        status = "✓ PASS" if passed else "✗ FAIL"
+        print(f"{status}  {os.path.basename(filepath)} ({len(issues)} issues, {len(warnings)} warnings)")
+        for issue in issues:
+            print(f"    - {issue}")
+
+    failed = sum(1 for _, passed, _, _ in results if not passed)
+    print("=" * 70)
+    print(f"Passed: {len(results) - failed}/{len(results)}")
+    if failed:
+        print("⚠ PHI LEAKAGE DETECTED - run on a single file for the full report")
 
 
 def main():
     """Main entry point"""
     if len(sys.argv) < 2:
-        print("Usage: python anonymization_verifier.py <anonymized_file.SCP> [original_file.SCP]")
+        print("Usage: python anonymization_verifier.py <anonymized_file.SCP | directory> [original_file.SCP]")
         print("\nExamples:")
         print("  # Basic verification")
         print("  python anonymization_verifier.py anonymized/ECG_ANON000001.SCP")
         print("\n  # With original file for comparison")
         print("  python anonymization_verifier.py anonymized/ECG_ANON000001.SCP original/ECG_patient.SCP")
-        print("\n  # Batch verification")
-        print("  for f in anonymized/*.SCP; do python anonymization_verifier.py \"$f\"; done")
+        print("\n  # Batch verification (all .SCP files in a directory, in parallel)")
+        print("  python anonymization_verifier.py anonymized/")
         return 1
 
+    if os.path.isdir(sys.argv[1]):
+        scp_files = sorted(entry.path for entry in os.scandir(sys.argv[1])
+                           if entry.name.endswith('.SCP') and entry.is_file())
+        if not scp_files:
+            print(f"No SCP files found in: {sys.argv[1]}")
+            return 1
+
+        results = verify_many(scp_files)
+        _print_batch_results(results)
+        return 0 if all(passed for _, passed, _, _ in results) else 1
+
     anonymized_file = sys.argv[1]
     original_file = sys.argv[2] if len(sys.argv) > 2 else None
 
@@ -8,14 +8,32 @@ Provides centralized logging configuration with:
 - Console logging for immediate feedback
 - Separate logs for different activities
 - Rotation to prevent disk space issues
+- Background writing so logging calls don't block on file I/O
 """
 
+import atexit
 import logging
 import logging.handlers
+import multiprocessing
 import os
+import queue
+import re
+import sys
 from datetime import datetime
 from pathlib import Path
 
+# Logger used for per-file progress messages in batch tools
+PROGRESS_LOGGER = 'scp_tools.progress'
+
+# Background listeners started by setup_logging(), by logger name
+_listeners = {}
+
+# Day (YYYYMMDD) each activity logger's file handler was opened for
+_activity_log_days = {}
+
+# ActivityLogger outcome records: "<time> | <level> | START: ..." etc.
+_ACTIVITY_RECORD_RE = re.compile(r'\| (START|SUCCESS|FAILED):')
+
 
 def setup_logging(name='scp_tools', log_dir=None, level=logging.INFO):
     """
@@ -43,6 +61,7 @@ def setup_logging(name='scp_tools', log_dir=None, level=logging.INFO):
     logger.setLevel(level)
     
     # Remove existing handlers to avoid duplicates
+    stop_logging(name)
     logger.handlers.clear()
     
     # Create formatters
@@ -81,14 +100,49 @@ def setup_logging(name='scp_tools', log_dir=None, level=logging.INFO):
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(simple_formatter)
     
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(error_handler)
-    logger.addHandler(console_handler)
+    # Logging calls only enqueue records; a listener thread runs the handlers
+    log_queue = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, error_handler, console_handler,
+        respect_handler_level=True
+    )
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener.start()
+    _listeners[name] = listener
     
     return logger
 
 
+def stop_logging(name=None):
+    """
+    Stop background log listeners, writing out any queued records.
+    Runs automatically at interpreter exit.
+    
+    Args:
+        name: Logger name passed to setup_logging(), or None for all
+    """
+    names = list(_listeners) if name is None else [name]
+    for logger_name in names:
+        listener = _listeners.pop(logger_name, None)
+        if listener is not None:
+            listener.stop()
+
+
+def _log_directly_after_fork():
+    """Forked children don't inherit listener threads; attach the handlers directly"""
+    for name, listener in _listeners.items():
+        logger = logging.getLogger(name)
+        logger.handlers.clear()
+        for handler in listener.handlers:
+            logger.addHandler(handler)
+    _listeners.clear()
+
+
+atexit.register(stop_logging)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_log_directly_after_fork)
+
+
 def get_activity_logger(activity_name):
     """
     Get a logger for a specific activity (read, anonymize, visualize, etc.)
@@ -99,15 +153,20 @@ def get_activity_logger(activity_name):
     Returns:
         Logger configured for the activity
     """
+    logger = logging.getLogger(f'scp_tools.{activity_name}')
+    
+    # Reuse the handler until the day changes
+    day = datetime.now().strftime("%Y%m%d")
+    if _activity_log_days.get(activity_name) == day:
+        return logger
+    
     # Find project root
     current_path = Path(__file__).parent.parent
     log_dir = current_path / 'logs' / 'activities'
     log_dir.mkdir(parents=True, exist_ok=True)
     
-    logger = logging.getLogger(f'scp_tools.{activity_name}')
-    
     # Activity-specific file handler with daily logs
-    log_file = log_dir / f'{activity_name}_{datetime.now().strftime("%Y%m%d")}.log'
+    log_file = log_dir / f'{activity_name}_{day}.log'
     handler = logging.handlers.RotatingFileHandler(
         log_file,
         maxBytes=5*1024*1024,
@@ -118,14 +177,54 @@ def get_activity_logger(activity_name):
         datefmt='%Y-%m-%d %H:%M:%S'
     ))
     
-    # Clear existing handlers and add new one
+    # Replace the previous day's handler, if any
+    for old_handler in logger.handlers:
+        old_handler.close()
     logger.handlers.clear()
     logger.addHandler(handler)
     logger.setLevel(logging.INFO)
+    _activity_log_days[activity_name] = day
     
     return logger
 
 
+def start_progress_listener(level=logging.INFO):
+    """
+    Start a listener that prints progress records from worker processes
+    through a single console handler
+    
+    Args:
+        level: Minimum level to print
+        
+    Returns:
+        (queue, listener) - pass queue to init_progress_logging() in each
+        process and call listener.stop() when done
+    """
+    queue = multiprocessing.Queue(-1)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    listener = logging.handlers.QueueListener(queue, handler)
+    listener.start()
+    init_progress_logging(queue, level)
+    return queue, listener
+
+
+def init_progress_logging(queue, level=logging.INFO):
+    """
+    Send this process's progress logger to the listener queue.
+    Suitable as a ProcessPoolExecutor initializer.
+    
+    Args:
+        queue: Queue returned by start_progress_listener()
+        level: Minimum level to emit; lower records are dropped before queueing
+    """
+    logger = logging.getLogger(PROGRESS_LOGGER)
+    logger.handlers.clear()
+    logger.addHandler(logging.handlers.QueueHandler(queue))
+    logger.setLevel(level)
+    logger.propagate = False
+
+
 class ActivityLogger:
     """Context manager for logging activities with success/failure tracking"""
     
@@ -202,16 +301,19 @@ def log_summary(logger=None):
         activity_type = log_file.stem.split('_')[0]
         
         with open(log_file, 'r') as f:
-            lines = f.readlines()
-            
-        for line in lines:
-            if 'START:' in line:
-                summary['total_activities'] += 1
-                summary['by_type'][activity_type] = summary['by_type'].get(activity_type, 0) + 1
-            elif 'SUCCESS:' in line:
-                summary['successful'] += 1
-            elif 'FAILED:' in line:
-                summary['failed'] += 1
+            for line in f:
+                match = _ACTIVITY_RECORD_RE.search(line)
+                if not match:
+                    continue
+                
+                kind = match.group(1)
+                if kind == 'START':
+                    summary['total_activities'] += 1
+                    summary['by_type'][activity_type] = summary['by_type'].get(activity_type, 0) + 1
+                elif kind == 'SUCCESS':
+                    summary['successful'] += 1
+                else:
+                    summary['failed'] += 1
     
     # Log summary
     logger.info("="*60)
@@ -9,6 +9,10 @@ import struct
 import os
 import sys
 import hashlib
+import io
+from binascii import crc_hqx
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
 from datetime import datetime
 import shutil
 try:
@@ -20,7 +24,77 @@ except ImportError:
     from logging_config import setup_logging, ActivityLogger, get_activity_logger
     logger = setup_logging('scp_anonymizer')
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Precompiled little-endian unpackers, read in place with unpack_from
+_SECTION_HEADER = struct.Struct('<HI')  # Section ID, section length (after the CRC)
+_U16 = struct.Struct('<H')
+_DATE = struct.Struct('<HBB')  # Year, month, day
+
+# Name replacement, sliced to the tag length (longer tags build their own)
+_REMOVED_PAD = b'REMOVED\x00' * 64
+
+
+def _build_id_automaton(id_bytes):
+    """
+    Build an Aho-Corasick automaton over every encoding of the known patient
+    IDs, or return None if pyahocorasick is not installed
+    (pip install scp-ecg-tools[fast]).
+
+    pyahocorasick matches str, so patterns are keyed by their latin-1 decoding,
+    which maps each byte to one character.
+    """
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for _, id_ascii, id_utf16 in id_bytes:
+        for pattern in (id_ascii, id_utf16):
+            automaton.add_word(pattern.decode('latin-1'), pattern)
+    automaton.make_automaton()
+    return automaton
+
+
 class SCPAnonymizer:
+    # Common patient ID patterns to look for
+    # Based on the filenames, the IDs appear to be numeric strings
+    KNOWN_PATIENT_IDS = (
+        "197001138994",
+        "191010101010",
+        "123456789",
+        "1970011389",  # Partial matches
+        "1910101010",
+        "12345678"
+    )
+
+    # (id, ASCII bytes, UTF-16LE bytes), encoded once rather than per file
+    _KNOWN_PATIENT_ID_BYTES = tuple(
+        (original_id, original_id.encode('ascii'), original_id.encode('utf-16le'))
+        for original_id in KNOWN_PATIENT_IDS
+    )
+    _ID_AUTOMATON = _build_id_automaton(_KNOWN_PATIENT_ID_BYTES)
+
+    # All sensitive Section 1 tags that can be anonymized
+    SENSITIVE_TAGS = {
+        0: "Last name",
+        1: "First name",
+        2: "Patient ID",
+        5: "Date of birth",
+        6: "Last name",
+        7: "First name",
+        8: "Last name",
+        9: "First name",
+        10: "Date of birth",
+        21: "Latest confirming physician",
+        22: "Technician description",
+        25: "Acquisition date",
+        26: "Acquisition time",
+        30: "Free text field",
+        31: "Medical history codes"
+    }
+
     def __init__(self, filepath, anonymous_id=None, anonymize_datetime=True, anonymize_freetext=True):
         """
         Initialize SCP-ECG file anonymizer.
@@ -42,30 +116,25 @@ class SCPAnonymizer:
     def calculate_crc_ccitt(data):
         """
         Calculate CRC-CCITT checksum for SCP-ECG files.
-        Uses polynomial 0x1021 with initial value 0xFFFF.
+        Uses polynomial 0x1021 with initial value 0xFFFF, which is exactly
+        what binascii.crc_hqx computes (in C).
 
         Args:
-            data: bytes or bytearray to calculate CRC for (excludes the CRC field itself)
+            data: bytes-like object (bytes, bytearray, memoryview) to calculate
+                  CRC for (excludes the CRC field itself)
 
         Returns:
             16-bit CRC value
         """
-        crc = 0xFFFF
-        for byte in data:
-            crc ^= (byte << 8)
-            for _ in range(8):
-                if crc & 0x8000:
-                    crc = (crc << 1) ^ 0x1021
-                else:
-                    crc = crc << 1
-                crc &= 0xFFFF
-        return crc
+        return crc_hqx(data, 0xFFFF)
 
     @staticmethod
     def calculate_scp_section_crc(data):
         """
         Calculate SCP-ECG section CRC as used in parsescp.c from PhysioNet.
         This is the proper CRC algorithm for individual SCP-ECG sections.
+        parsescp.c computes it a nibble at a time, but the result is the
+        same CRC-CCITT (poly 0x1021, init 0xFFFF) as calculate_crc_ccitt.
 
         Args:
             data: bytes or bytearray to calculate CRC for
@@ -73,70 +142,7 @@ class SCPAnonymizer:
         Returns:
             16-bit CRC value
         """
-        crchigh = 0xFF
-        crclow = 0xFF
-
-        for byte_val in data:
-            # XOR with crchigh
-            crchigh = a = byte_val ^ crchigh
-
-            # a >>= 4
-            a >>= 4
-
-            # a ^= crchigh
-            a ^= crchigh
-
-            # crchigh = crclow
-            crchigh = crclow
-
-            # crclow = a
-            crclow = a
-
-            # b = (a & 0xf) << 4
-            b = (a & 0xF) << 4
-
-            # a >>= 4
-            a >>= 4
-
-            # b = a |= b
-            a |= b
-            b = a
-
-            # if (a & 0x80) a = (a << 1) | 1; else a <<= 1
-            if a & 0x80:
-                a = (a << 1) | 1
-            else:
-                a <<= 1
-            a &= 0xFF  # Keep it 8-bit
-
-            # crchigh ^= a &= 0x1f
-            a &= 0x1F
-            crchigh ^= a
-
-            # a = b & 0xf0
-            a = b & 0xF0
-
-            # crchigh ^= a
-            crchigh ^= a
-
-            # if (b & 0x80) b = (b << 1) | 1; else b <<= 1
-            if b & 0x80:
-                b = (b << 1) | 1
-            else:
-                b <<= 1
-            b &= 0xFF  # Keep it 8-bit
-
-            # crclow ^= b &= 0xe0
-            b &= 0xE0
-            crclow ^= b
-
-            # Ensure 8-bit values
-            crchigh &= 0xFF
-            crclow &= 0xFF
-
-        # Combine into 16-bit CRC
-        crc = (crchigh << 8) | crclow
-        return crc
+        return crc_hqx(data, 0xFFFF)
 
     def update_file_size(self):
         """
@@ -162,8 +168,7 @@ class SCPAnonymizer:
             while pointer < len(self.data) - 16:
                 # Read section header
                 section_crc_offset = pointer
-                section_id = struct.unpack('<H', self.data[pointer+2:pointer+4])[0]
-                section_length = struct.unpack('<I', self.data[pointer+4:pointer+8])[0]
+                section_id, section_length = _SECTION_HEADER.unpack_from(self.data, pointer + 2)
 
                 # Validate section
                 if section_length == 0 or section_length > len(self.data) - pointer:
@@ -174,7 +179,7 @@ class SCPAnonymizer:
                 new_section_crc = self.calculate_scp_section_crc(section_data)
 
                 # Update section CRC
-                old_crc = struct.unpack('<H', self.data[pointer:pointer+2])[0]
+                old_crc = _U16.unpack_from(self.data, pointer)[0]
                 self.data[pointer:pointer+2] = struct.pack('<H', new_section_crc)
 
                 logger.info(f"Section {section_id} at offset {pointer}: CRC 0x{old_crc:04X} -> 0x{new_section_crc:04X}")
@@ -203,8 +208,10 @@ class SCPAnonymizer:
         The CRC is stored in the first 2 bytes (little-endian) and covers
         all data from byte 2 onwards.
         """
-        # Calculate CRC on all data except the first 2 bytes (the CRC field itself)
-        new_crc = self.calculate_crc_ccitt(self.data[2:])
+        # Calculate CRC on all data except the first 2 bytes (the CRC field itself),
+        # through a view so the file is not copied just to skip the CRC field
+        with memoryview(self.data) as view:
+            new_crc = self.calculate_crc_ccitt(view[2:])
 
         # Store CRC in little-endian format at bytes 0-1
         self.data[0:2] = struct.pack('<H', new_crc)
@@ -214,8 +221,11 @@ class SCPAnonymizer:
         
     def read_file(self):
         """Read the SCP file into memory"""
+        # Read straight into a mutable buffer rather than copying via bytes
         with open(self.filepath, 'rb') as f:
-            self.data = bytearray(f.read())
+            self.data = bytearray(os.fstat(f.fileno()).st_size)
+            bytes_read = f.readinto(self.data)
+            del self.data[bytes_read:]
         print(f"Read {len(self.data)} bytes from {os.path.basename(self.filepath)}")
         
     def anonymize_filename(self, output_dir=None):
@@ -239,52 +249,49 @@ class SCPAnonymizer:
     
     def find_and_replace_text(self, search_bytes, replace_bytes):
         """Find and replace byte sequences in the file"""
+        if not search_bytes:
+            return 0
+        # Replace with the new bytes (padded or truncated to same length)
+        length = len(search_bytes)
+        replace_padded = replace_bytes[:length].ljust(length, b'\x00')
+        # Same length, so matches are overwritten in place; find() scans in C
+        # and only the handful of matches costs a Python iteration
         count = 0
-        index = 0
-        while True:
-            index = self.data.find(search_bytes, index)
-            if index == -1:
-                break
-            # Replace with the new bytes (padded or truncated to same length)
-            replace_padded = replace_bytes[:len(search_bytes)]
-            if len(replace_padded) < len(search_bytes):
-                replace_padded += b'\x00' * (len(search_bytes) - len(replace_padded))
-            self.data[index:index+len(search_bytes)] = replace_padded
+        pos = self.data.find(search_bytes)
+        while pos != -1:
+            self.data[pos:pos+length] = replace_padded
             count += 1
-            index += len(search_bytes)
+            pos = self.data.find(search_bytes, pos + length)
         return count
     
     def anonymize_patient_data(self):
         """Anonymize patient identifying information in the file"""
         
-        # Common patient ID patterns to look for
-        # Based on the filenames, the IDs appear to be numeric strings
-        original_ids = [
-            "197001138994",
-            "191010101010", 
-            "123456789",
-            "1970011389",  # Partial matches
-            "1910101010",
-            "12345678"
-        ]
-        
         # Search for and replace patient IDs
-        for original_id in original_ids:
+        anon_ascii = self.anonymous_id.encode('ascii')
+        anon_utf16 = self.anonymous_id.encode('utf-16le')
+
+        # With pyahocorasick, one sweep finds which IDs occur at all. Until
+        # something is replaced the data is unchanged, so absent IDs can be
+        # skipped; after a replacement every remaining ID is searched as usual.
+        present = None
+        if self._ID_AUTOMATON is not None:
+            present = {pattern for _, pattern in self._ID_AUTOMATON.iter(self.data.decode('latin-1'))}
+
+        for original_id, id_ascii, id_utf16 in self._KNOWN_PATIENT_ID_BYTES:
             # Try as ASCII text
-            count = self.find_and_replace_text(
-                original_id.encode('ascii'),
-                self.anonymous_id.encode('ascii')
-            )
-            if count > 0:
-                self.changes_made.append(f"Replaced {count} instances of ID '{original_id}'")
+            if present is None or id_ascii in present:
+                count = self.find_and_replace_text(id_ascii, anon_ascii)
+                if count > 0:
+                    present = None
+                    self.changes_made.append(f"Replaced {count} instances of ID '{original_id}'")
             
             # Try as UTF-16 (some medical systems use this)
-            count = self.find_and_replace_text(
-                original_id.encode('utf-16le'),
-                self.anonymous_id.encode('utf-16le')
-            )
-            if count > 0:
-                self.changes_made.append(f"Replaced {count} instances of ID '{original_id}' (UTF-16)")
+            if present is None or id_utf16 in present:
+                count = self.find_and_replace_text(id_utf16, anon_utf16)
+                if count > 0:
+                    present = None
+                    self.changes_made.append(f"Replaced {count} instances of ID '{original_id}' (UTF-16)")
         
         # Look for common name patterns and replace them
         # Search for "test" which appears in some files
@@ -304,25 +311,20 @@ class SCPAnonymizer:
         pointer = 6  # Skip file CRC (2) and file size (4)
 
         while pointer < len(self.data) - 16:
-            try:
-                # Read section header: CRC(2) + ID(2) + Size(4) + ...
-                section_id = struct.unpack('<H', self.data[pointer+2:pointer+4])[0]
-                section_size = struct.unpack('<I', self.data[pointer+4:pointer+8])[0]
-
-                # Section 1 is patient/device data
-                if section_id == 1 and section_size < len(self.data):
-                    print(f"Found Section 1 at offset {pointer}, size {section_size}")
-                    # Tags start after 16-byte header: CRC(2) + ID(2) + Size(4) + Version(1) + Protocol(1) + Reserved(6)
-                    self._anonymize_section_1_tags(pointer + 16, section_size - 16)
-                    break
-
-                # Move to next potential section
-                if section_size > 0 and section_size < len(self.data):
-                    pointer += section_size
-                else:
-                    pointer += 1
+            # Read section header: CRC(2) + ID(2) + Size(4) + ...
+            section_id, section_size = _SECTION_HEADER.unpack_from(self.data, pointer + 2)
+
+            # Section 1 is patient/device data
+            if section_id == 1 and section_size < len(self.data):
+                print(f"Found Section 1 at offset {pointer}, size {section_size}")
+                # Tags start after 16-byte header: CRC(2) + ID(2) + Size(4) + Version(1) + Protocol(1) + Reserved(6)
+                self._anonymize_section_1_tags(pointer + 16, section_size - 16)
+                break
 
-            except:
+            # Move to next potential section
+            if section_size > 0 and section_size < len(self.data):
+                pointer += section_size
+            else:
                 pointer += 1
                 
     def _anonymize_section_1_tags(self, start_offset, length):
@@ -333,37 +335,20 @@ class SCPAnonymizer:
         pointer = start_offset
         end = min(start_offset + length, len(self.data))
 
-        # All sensitive tags that can be anonymized
-        sensitive_tags = {
-            0: "Last name",
-            1: "First name",
-            2: "Patient ID",
-            5: "Date of birth",
-            6: "Last name",
-            7: "First name",
-            8: "Last name",
-            9: "First name",
-            10: "Date of birth",
-            21: "Latest confirming physician",
-            22: "Technician description",
-            25: "Acquisition date",
-            26: "Acquisition time",
-            30: "Free text field",
-            31: "Medical history codes"
-        }
-
-        while pointer < end - 3:
-            try:
-                tag = self.data[pointer]
+        # Every replacement is exactly value_length bytes, so writes go through
+        # a memoryview, which skips bytearray's resize handling
+        with memoryview(self.data) as view:
+            while pointer < end - 3:
+                tag = view[pointer]
                 if tag == 255:  # Section terminator
                     break
 
-                tag_length = struct.unpack('<H', self.data[pointer+1:pointer+3])[0]
+                tag_length = _U16.unpack_from(view, pointer + 1)[0]
 
                 # Check if this tag should be anonymized
                 should_anonymize = False
 
-                if tag in sensitive_tags:
+                if tag in self.SENSITIVE_TAGS:
                     # Always anonymize patient identifiers (ID, names, DOB)
                     if tag in [0, 1, 2, 5, 6, 7, 8, 9, 10]:
                         should_anonymize = True
@@ -381,52 +366,49 @@ class SCPAnonymizer:
                     # Anonymize this field
                     value_start = pointer + 3
                     value_end = min(value_start + tag_length, len(self.data))
+                    # A value cut off by the end of the file is overwritten only as far as it goes
+                    value_length = value_end - value_start
+                    if value_length < tag_length:
+                        logger.warning(f"Section 1 tag {tag} at offset {pointer} runs past the end of the file")
 
                     if tag == 2:  # Patient ID
                         # Replace with anonymous ID
-                        anon_bytes = self.anonymous_id.encode('ascii')[:tag_length]
-                        anon_bytes += b'\x00' * (tag_length - len(anon_bytes))
-                        self.data[value_start:value_end] = anon_bytes
-                        self.changes_made.append(f"Anonymized {sensitive_tags[tag]}")
+                        anon_bytes = self.anonymous_id.encode('ascii')[:value_length].ljust(value_length, b'\x00')
+                        view[value_start:value_end] = anon_bytes
+                        self.changes_made.append(f"Anonymized {self.SENSITIVE_TAGS[tag]}")
                     elif tag in [0, 1, 6, 7, 8, 9]:  # Names
                         # Replace with REMOVED (properly sized to avoid expanding bytearray)
-                        removed_bytes = (b'REMOVED\x00' * (tag_length // 8 + 1))[:tag_length]
-                        self.data[value_start:value_end] = removed_bytes
-                        self.changes_made.append(f"Anonymized {sensitive_tags[tag]}")
+                        if value_length <= len(_REMOVED_PAD):
+                            removed_bytes = _REMOVED_PAD[:value_length]
+                        else:
+                            removed_bytes = (b'REMOVED\x00' * (value_length // 8 + 1))[:value_length]
+                        view[value_start:value_end] = removed_bytes
+                        self.changes_made.append(f"Anonymized {self.SENSITIVE_TAGS[tag]}")
                     elif tag in [5, 10]:  # Date of birth
                         # Set to 1900-01-01 (using LITTLE-ENDIAN for year)
-                        if tag_length >= 4:
-                            self.data[value_start:value_start+2] = struct.pack('<H', 1900)
-                            self.data[value_start+2] = 1  # Month
-                            self.data[value_start+3] = 1  # Day
-                            self.changes_made.append(f"Anonymized {sensitive_tags[tag]}")
+                        if value_length >= 4:
+                            _DATE.pack_into(view, value_start, 1900, 1, 1)  # Year, month, day
+                            self.changes_made.append(f"Anonymized {self.SENSITIVE_TAGS[tag]}")
                     elif tag == 25:  # Acquisition date
                         # Set to 2000-01-01 (using LITTLE-ENDIAN for year, required by Idoven API)
-                        if tag_length >= 4:
-                            self.data[value_start:value_start+2] = struct.pack('<H', 2000)
-                            self.data[value_start+2] = 1  # Month
-                            self.data[value_start+3] = 1  # Day
-                            self.changes_made.append(f"Anonymized {sensitive_tags[tag]} to 2000-01-01")
+                        if value_length >= 4:
+                            _DATE.pack_into(view, value_start, 2000, 1, 1)  # Year, month, day
+                            self.changes_made.append(f"Anonymized {self.SENSITIVE_TAGS[tag]} to 2000-01-01")
                     elif tag == 26:  # Acquisition time
                         # Set to 12:00:00 (noon - more realistic than 00:00:00)
-                        if tag_length >= 3:
-                            self.data[value_start] = 12    # Hour
-                            self.data[value_start+1] = 0   # Minute
-                            self.data[value_start+2] = 0   # Second
-                            self.changes_made.append(f"Anonymized {sensitive_tags[tag]} to 12:00:00")
+                        if value_length >= 3:
+                            view[value_start:value_start+3] = bytes((12, 0, 0))  # Hour, minute, second
+                            self.changes_made.append(f"Anonymized {self.SENSITIVE_TAGS[tag]} to 12:00:00")
                     elif tag in [21, 22]:  # Physician/Technician names
                         # Zero out the field
-                        self.data[value_start:value_end] = b'\x00' * tag_length
-                        self.changes_made.append(f"Anonymized {sensitive_tags[tag]}")
+                        view[value_start:value_end] = b'\x00' * value_length
+                        self.changes_made.append(f"Anonymized {self.SENSITIVE_TAGS[tag]}")
                     elif tag in [30, 31]:  # Free text and medical history
                         # Zero out the field
-                        self.data[value_start:value_end] = b'\x00' * tag_length
-                        self.changes_made.append(f"Anonymized {sensitive_tags[tag]}")
+                        view[value_start:value_end] = b'\x00' * value_length
+                        self.changes_made.append(f"Anonymized {self.SENSITIVE_TAGS[tag]}")
 
                 pointer += 3 + tag_length
-
-            except Exception as e:
-                pointer += 1
     
     def save_anonymized(self, output_path=None):
         """Save the anonymized file"""
@@ -481,10 +463,23 @@ class SCPAnonymizer:
                 raise
 
 
+def _anonymize_one(filepath, anon_id, output_dir):
+    """Anonymize one file into output_dir (runs in a worker process)"""
+    report = io.StringIO()
+    with redirect_stdout(report):
+        anonymizer = SCPAnonymizer(filepath, anon_id)
+        # Get just the filename, not the full path
+        output_filename = os.path.basename(anonymizer.anonymize_filename())
+        output_path = os.path.join(output_dir, output_filename)
+        output_file = anonymizer.anonymize(output_path)
+    return output_file, report.getvalue()
+
+
 def main():
     if len(sys.argv) < 2:
         # Process all SCP files in current directory
-        scp_files = [f for f in os.listdir('.') if f.endswith('.SCP') and not 'ANON' in f]
+        scp_files = [entry.name for entry in os.scandir('.')
+                     if entry.name.endswith('.SCP') and 'ANON' not in entry.name and entry.is_file()]
         
         if not scp_files:
             print("No SCP files found to anonymize")
@@ -502,16 +497,14 @@ def main():
         
         anonymized_files = []
         
-        for i, filepath in enumerate(scp_files, 1):
-            # Generate unique anonymous ID for each file
-            anon_id = f"ANON{i:06d}"
-            
-            anonymizer = SCPAnonymizer(filepath, anon_id)
-            # Get just the filename, not the full path
-            output_filename = os.path.basename(anonymizer.anonymize_filename())
-            output_path = os.path.join(output_dir, output_filename)
-            output_file = anonymizer.anonymize(output_path)
-            anonymized_files.append(output_file)
+        # Files are independent, so anonymize them in parallel; each worker's
+        # report is printed here, in input order
+        anon_ids = [f"ANON{i:06d}" for i in range(1, len(scp_files) + 1)]
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for output_file, report in executor.map(_anonymize_one, scp_files, anon_ids,
+                                                    [output_dir] * len(scp_files)):
+                print(report, end='')
+                anonymized_files.append(output_file)
         
         print("\n" + "=" * 60)
         print(f"ANONYMIZATION COMPLETE")
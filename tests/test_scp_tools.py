@@ -15,11 +15,17 @@ Run tests:
 """
 
 import unittest
+import functools
+import itertools
 import os
 import tempfile
 import shutil
+# Headless backend before pyplot is first imported (by scp_reader below)
+import matplotlib
+matplotlib.use('Agg')
 import numpy as np
 from unittest.mock import patch, MagicMock
+import re
 import struct
 
 # Import modules to test
@@ -28,19 +34,41 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from src.scp_reader import SCPReader
 from src.scp_anonymizer import SCPAnonymizer
+from src import anonymization_verifier
+try:
+    import idoven_api
+except ImportError:  # requests not installed
+    idoven_api = None
+
+
+@functools.lru_cache(maxsize=1)
+def _discover_scp_files():
+    """List the sample SCP files once for all test classes"""
+    data_dir = os.path.join(os.path.dirname(__file__), '..', 'data', 'original')
+    if not os.path.isdir(data_dir):
+        return []
+    with os.scandir(data_dir) as entries:
+        return [entry.path for entry in entries if entry.name.endswith('.SCP')]
 
 
 class TestSCPReader(unittest.TestCase):
     """Test cases for SCP file reader"""
     
-    def setUp(self):
-        """Set up test fixtures"""
-        data_dir = os.path.join(os.path.dirname(__file__), '..', 'data', 'original')
-        if os.path.exists(data_dir):
-            self.test_files = [os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith('.SCP')]
-        else:
-            self.test_files = []
-        self.test_file = self.test_files[0] if self.test_files else None
+    @classmethod
+    def setUpClass(cls):
+        """Set up test fixtures, parsing the sample file once for the read-only tests"""
+        cls.test_files = _discover_scp_files()
+        cls.test_file = cls.test_files[0] if cls.test_files else None
+        cls.reader = None
+        if cls.test_file:
+            cls.reader = SCPReader(cls.test_file)
+            cls.reader.read_file()
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Release the shared reader"""
+        if cls.reader:
+            cls.reader.close()
         
     def test_file_reading(self):
         """Test that SCP files can be read"""
@@ -54,13 +82,17 @@ class TestSCPReader(unittest.TestCase):
         self.assertIsNotNone(reader.data)
         self.assertGreater(len(reader.data), 0)
         
+        # The parsed results outlive the file mapping
+        reader.close()
+        self.assertIsNone(reader.data)
+        self.assertIsNotNone(reader.ecg_data)
+        
     def test_ecg_data_extraction(self):
         """Test ECG data extraction"""
         if not self.test_file:
             self.skipTest("No SCP test files available")
             
-        reader = SCPReader(self.test_file)
-        reader.read_file()
+        reader = self.reader
         
         # Check ECG data
         self.assertIsNotNone(reader.ecg_data)
@@ -72,20 +104,32 @@ class TestSCPReader(unittest.TestCase):
         if not self.test_file:
             self.skipTest("No SCP test files available")
             
-        reader = SCPReader(self.test_file)
-        reader.read_file()
+        reader = self.reader
         
         expected_leads = ['I', 'II', 'III', 'aVR', 'aVL', 'aVF', 
                          'V1', 'V2', 'V3', 'V4', 'V5', 'V6']
         self.assertEqual(reader.leads, expected_leads)
         
-    def test_sampling_rate(self):
-        """Test sampling rate detection"""
+    def test_read_file_is_idempotent(self):
+        """Test that reading a file twice does not re-parse it"""
         if not self.test_file:
             self.skipTest("No SCP test files available")
             
         reader = SCPReader(self.test_file)
         reader.read_file()
+        leads = list(reader.leads)
+        ecg_data = reader.ecg_data
+        reader.read_file()
+        
+        self.assertEqual(reader.leads, leads)
+        self.assertIs(reader.ecg_data, ecg_data)
+        
+    def test_sampling_rate(self):
+        """Test sampling rate detection"""
+        if not self.test_file:
+            self.skipTest("No SCP test files available")
+            
+        reader = self.reader
         
         self.assertEqual(reader.sampling_rate, 500)
         
@@ -114,13 +158,63 @@ class TestSCPReader(unittest.TestCase):
         self.assertTrue(np.all(reader.ecg_data > -10))
         self.assertTrue(np.all(reader.ecg_data < 10))
         
+    @staticmethod
+    def _rhythm_section(compression, leads, sample_bytes):
+        """Section 6 header: 500 Hz, the given compression, lead count and sample width"""
+        data = bytearray()
+        data.extend(struct.pack('<HH', 5, 2000))  # Amplitude, 2000us interval (500 Hz)
+        data.extend(bytes([0, compression]))      # Encoding, compression (0 none, 1 first difference)
+        data.extend(struct.pack('<HH', leads, sample_bytes))
+        return data
+
+    def test_parse_uncompressed_rhythm_data(self):
+        """Test decoding of uncompressed int16 rhythm samples"""
+        samples = [[0, 1, -1, 32767, -32768], [10, -20, 30, -40, 50]]
+        data = self._rhythm_section(0, len(samples), 2)
+        for lead in samples:
+            data.extend(struct.pack('<I', len(lead)))
+            data.extend(struct.pack(f'<{len(lead)}h', *lead))
+        
+        reader = SCPReader("dummy.SCP")
+        reader._parse_rhythm_data(bytes(data))
+        
+        self.assertEqual(reader.sampling_rate, 500)
+        self.assertEqual(reader.ecg_data.shape, (2, 5))
+        np.testing.assert_array_equal(reader.ecg_data, samples)
+
+    def test_parse_uneven_rhythm_data(self):
+        """Test that leads with different sample counts are zero-padded"""
+        samples = [[1, 2, 3], [4, 5, 6, 7, 8]]
+        data = self._rhythm_section(0, len(samples), 2)
+        for lead in samples:
+            data.extend(struct.pack('<I', len(lead)))
+            data.extend(struct.pack(f'<{len(lead)}h', *lead))
+
+        reader = SCPReader("dummy.SCP")
+        reader._parse_rhythm_data(bytes(data))
+
+        np.testing.assert_array_equal(reader.ecg_data, [[1, 2, 3, 0, 0], [4, 5, 6, 7, 8]])
+
+    def test_parse_difference_rhythm_data(self):
+        """Test decoding of first-difference compressed rhythm samples"""
+        deltas = [1, -2, 127, -128, 0]
+        data = self._rhythm_section(1, 1, 1)
+        data.extend(struct.pack('<I', len(deltas) + 1))
+        data.extend(struct.pack('<h', -300))      # Reference sample
+        data.extend(struct.pack(f'<{len(deltas)}b', *deltas))
+
+        reader = SCPReader("dummy.SCP")
+        reader._parse_rhythm_data(bytes(data))
+
+        self.assertEqual(reader.ecg_data.shape, (1, 6))
+        np.testing.assert_array_equal(reader.ecg_data[0], -300 + np.cumsum([0] + deltas))
+
     def test_visualization_modes(self):
         """Test both visualization modes"""
         if not self.test_file:
             self.skipTest("No SCP test files available")
             
-        reader = SCPReader(self.test_file)
-        reader.read_file()
+        reader = self.reader
         
         # Test that visualization methods exist and are callable
         self.assertTrue(hasattr(reader, 'visualize'))
@@ -128,36 +222,66 @@ class TestSCPReader(unittest.TestCase):
         self.assertTrue(hasattr(reader, '_visualize_medical_format'))
         self.assertTrue(hasattr(reader, '_visualize_standard'))
 
+    def test_visualization_reuses_figure(self):
+        """Test redrawing into one figure after a switch of mode or a clear"""
+        import matplotlib.pyplot as plt
+
+        reader = SCPReader("dummy.SCP")
+        reader._generate_sample_data()
+        fig = plt.figure()
+        try:
+            reader.visualize(paper_style=True, show=False, fig=fig)
+            reader.visualize(paper_style=False, show=False, fig=fig)
+            self.assertEqual(len(fig.axes), 12)
+
+            # Medical after standard draws the medical layout again
+            reader.visualize(paper_style=True, show=False, fig=fig)
+            self.assertEqual(len(fig.axes), 4)
+            self.assertEqual(fig._suptitle.get_text(), '12-Lead ECG')
+
+            # So does medical after the caller cleared the figure
+            fig.clear()
+            reader.visualize(paper_style=True, show=False, fig=fig)
+            self.assertEqual(len(fig.axes), 4)
+            self.assertEqual(len(fig.axes[3].lines), 1)
+        finally:
+            plt.close(fig)
+
 
 class TestSCPAnonymizer(unittest.TestCase):
     """Test cases for SCP file anonymizer"""
     
+    @classmethod
+    def setUpClass(cls):
+        """Create the test SCP file once; the anonymizer only reads it"""
+        cls.fixture_dir = tempfile.mkdtemp()
+        cls.test_file = cls._create_test_scp_file(cls.fixture_dir)
+        
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test SCP file and anything written next to it"""
+        shutil.rmtree(cls.fixture_dir, ignore_errors=True)
+        
     def setUp(self):
-        """Set up test fixtures"""
+        """Set up a directory for test outputs"""
         self.temp_dir = tempfile.mkdtemp()
-        self.test_file = self._create_test_scp_file()
         
     def tearDown(self):
         """Clean up test fixtures"""
         if os.path.exists(self.temp_dir):
             shutil.rmtree(self.temp_dir)
             
-    def _create_test_scp_file(self):
+    @staticmethod
+    def _create_test_scp_file(directory):
         """Create a test SCP file with known patient ID"""
-        test_file = os.path.join(self.temp_dir, "ECG_20230101_120000_999888777.SCP")
+        test_file = os.path.join(directory, "ECG_20230101_120000_999888777.SCP")
         
-        # Create minimal SCP structure with patient ID
-        data = bytearray()
-        # Add header
-        data.extend(struct.pack('<H', 0))  # CRC
-        data.extend(struct.pack('<I', 100))  # File size
-        
-        # Add patient ID in data
-        data.extend(b'999888777')
-        data.extend(b'TestPatient')
-        
-        # Pad to minimum size
-        data.extend(b'\x00' * (100 - len(data)))
+        # Minimal SCP structure of 100 bytes: header (CRC, file size),
+        # then the patient ID and name, zero padded
+        data = bytearray(100)
+        struct.pack_into('<HI', data, 0, 0, 100)
+        data[6:15] = b'999888777'
+        data[15:26] = b'TestPatient'
         
         with open(test_file, 'wb') as f:
             f.write(data)
@@ -180,7 +304,17 @@ class TestSCPAnonymizer(unittest.TestCase):
         self.assertIsNotNone(anonymizer.data)
         self.assertIsInstance(anonymizer.data, bytearray)
         self.assertGreater(len(anonymizer.data), 0)
-        
+
+    def test_crc_ccitt(self):
+        """Test CRC-CCITT check values and that the section CRC matches it"""
+        # Standard CRC-16/CCITT-FALSE check values
+        self.assertEqual(SCPAnonymizer.calculate_crc_ccitt(b'123456789'), 0x29B1)
+        self.assertEqual(SCPAnonymizer.calculate_crc_ccitt(b'HELLO'), 0x49D6)
+
+        data = np.random.RandomState(0).randint(0, 256, 5000).astype(np.uint8).tobytes()
+        self.assertEqual(SCPAnonymizer.calculate_scp_section_crc(data),
+                         SCPAnonymizer.calculate_crc_ccitt(data))
+
     def test_anonymize_filename(self):
         """Test filename anonymization"""
         anonymizer = SCPAnonymizer(self.test_file, "ANON123")
@@ -209,13 +343,36 @@ class TestSCPAnonymizer(unittest.TestCase):
         """Test patient data anonymization"""
         anonymizer = SCPAnonymizer(self.test_file, "ANON123")
         anonymizer.read_file()
-        initial_data = anonymizer.data.copy()
         anonymizer.anonymize_patient_data()
         
         # Check that some change was made (even if ID wasn't found in this test file)
         # The anonymizer should at least try to process the file
         self.assertIsNotNone(anonymizer.data)
-        
+
+    def test_known_patient_ids_replaced(self):
+        """Test that known patient IDs are replaced in ASCII and UTF-16"""
+        anonymizer = SCPAnonymizer(self.test_file, "ANON123")
+        anonymizer.read_file()
+        anonymizer.data[20:32] = b'197001138994'
+        anonymizer.data[40:60] = '1910101010'.encode('utf-16le')
+        anonymizer.anonymize_patient_data()
+
+        self.assertNotIn(b'197001138994', anonymizer.data)
+        self.assertNotIn('1910101010'.encode('utf-16le'), anonymizer.data)
+        self.assertEqual(anonymizer.data[20:32], b'ANON123\x00\x00\x00\x00\x00')
+        self.assertIn("Replaced 1 instances of ID '197001138994'", anonymizer.changes_made)
+        self.assertIn("Replaced 1 instances of ID '1910101010' (UTF-16)", anonymizer.changes_made)
+
+    def test_truncated_section_1_tag(self):
+        """Test that a tag value cut off by the end of the file is overwritten in place"""
+        anonymizer = SCPAnonymizer(self.test_file, "ANON123")
+        anonymizer.data = bytearray(40) + bytes([0]) + struct.pack('<H', 20) + b'Smith'
+        anonymizer._anonymize_section_1_tags(40, 30)
+
+        self.assertEqual(len(anonymizer.data), 48)
+        self.assertEqual(anonymizer.data[43:], b'REMOV')
+        self.assertEqual(anonymizer.changes_made, ["Anonymized Last name"])
+
     def test_save_anonymized(self):
         """Test saving anonymized file"""
         anonymizer = SCPAnonymizer(self.test_file, "ANON123")
@@ -253,13 +410,13 @@ class TestSCPAnonymizer(unittest.TestCase):
 class TestIntegration(unittest.TestCase):
     """Integration tests for the complete workflow"""
     
+    @classmethod
+    def setUpClass(cls):
+        """Find the sample files once"""
+        cls.test_files = _discover_scp_files()
+    
     def setUp(self):
         """Set up test environment"""
-        data_dir = os.path.join(os.path.dirname(__file__), '..', 'data', 'original')
-        if os.path.exists(data_dir):
-            self.test_files = [os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith('.SCP')]
-        else:
-            self.test_files = []
         self.temp_dir = tempfile.mkdtemp()
         
     def tearDown(self):
@@ -353,6 +510,7 @@ class TestDataValidation(unittest.TestCase):
             # Should generate sample data as fallback
             self.assertIsNotNone(reader.ecg_data)
             self.assertEqual(reader.ecg_data.shape, (12, 5000))
+            reader.close()
         finally:
             os.unlink(temp_file)
             
@@ -371,6 +529,112 @@ class TestDataValidation(unittest.TestCase):
             os.unlink(temp_file)
 
 
+class _StubPrefilter:
+    """Stands in for the hyperscan database: reports each pattern whose
+    prefilter expression (the superset, for lookaround patterns) matches"""
+    
+    def __init__(self):
+        self.scans = 0
+        self.expressions = [
+            re.compile(anonymization_verifier._PREFILTER_SUPERSETS.get(pattern, pattern.pattern),
+                       pattern.flags & re.IGNORECASE)
+            for pattern in anonymization_verifier._PHI_PATTERN_LIST]
+        
+    def scan(self, text, match_event_handler):
+        self.scans += 1
+        for pattern_id, expression in enumerate(self.expressions):
+            match = expression.search(text)
+            if match:
+                match_event_handler(pattern_id, 0, match.end(), 0, None)
+
+
+class TestAnonymizationVerifier(unittest.TestCase):
+    """Test cases for the verifier's PHI scan"""
+    
+    # Real PHI next to text that only the prefilter supersets match: a
+    # placeholder ID, an 11-digit run and a dashed number inside digits
+    TEXT = (b'\x01\x02Patient John Smith, DOB 1970-01-13 tel (555) 123-4567\x00\x00'
+            b'alt 555-123-4567 or 5551234567 mail j.smith@example.com\x03'
+            b'MRN 12345678 ssn 123-45-6789\xff\xfe'
+            b'ID 00000000 ref 12345678901 code 9555-123-45670\x00')
+    
+    def _scan(self, prefilter):
+        verifier = anonymization_verifier.AnonymizationVerifier("dummy.SCP")
+        verifier.data = self.TEXT
+        verifier._size = len(self.TEXT)
+        verifier._sections = []
+        with patch.object(anonymization_verifier, '_PHI_PREFILTER', prefilter):
+            return verifier._scan_phi()
+        
+    def test_prefilter_matches_re_scan(self):
+        """Test that the prefiltered PHI scan finds exactly what re alone finds"""
+        prefilter = _StubPrefilter()
+        expected = self._scan(None)
+        
+        self.assertEqual(self._scan(prefilter), expected)
+        self.assertEqual(prefilter.scans, 1)
+        
+        # The lookaround patterns behind the supersets keep their exclusions
+        self.assertEqual([match for _, match in expected['phone']],
+                         [b'(555) 123-4567', b'555-123-4567', b'5551234567'])
+        self.assertNotIn(b'00000000', [match for _, match in expected['numeric_id']])
+
+
+@unittest.skipIf(idoven_api is None, "requests not installed")
+class TestIdovenAPIClient(unittest.TestCase):
+    """Test cases for the analysis result cache of the Idoven API client"""
+    
+    def setUp(self):
+        """Client with a token and a mocked session"""
+        self.client = idoven_api.IdovenAPIClient()
+        self.client.access_token = "token"
+        self.client.token_expires_at = float('inf')
+        self.client.session = MagicMock()
+        
+    @staticmethod
+    def _response(status_code, result=None, etag=None):
+        response = MagicMock(status_code=status_code, headers={'ETag': etag} if etag else {})
+        response.json.return_value = result
+        return response
+        
+    @patch('builtins.print')
+    def test_not_modified_results_come_from_cache(self, mock_print):
+        """Test that a 304 revalidation returns the cached result"""
+        result = {'status': 'processing'}
+        self.client.session.get.side_effect = [self._response(200, result, '"v1"'),
+                                               self._response(304)]
+        
+        self.assertEqual(self.client.get_analysis_results('a1'), result)
+        self.assertIs(self.client.get_analysis_results('a1'), result)
+        
+        headers = self.client.session.get.call_args.kwargs['headers']
+        self.assertEqual(headers['If-None-Match'], '"v1"')
+        
+    @patch('builtins.print')
+    def test_cache_is_bounded(self, mock_print):
+        """Test that direct result lookups evict the oldest cached analysis"""
+        size = self.client.ANALYSIS_CACHE_SIZE
+        self.client.session.get.side_effect = [self._response(200, {'status': 'done'}, f'"{i}"')
+                                               for i in range(size + 1)]
+        for i in range(size + 1):
+            self.client.get_analysis_results(f'a{i}')
+        
+        self.assertEqual(len(self.client._analysis_cache), size)
+        self.assertNotIn('a0', self.client._analysis_cache)
+        self.assertIn(f'a{size}', self.client._analysis_cache)
+        
+    @patch('builtins.print')
+    @patch('idoven_api.time.sleep')
+    @patch('idoven_api.time.time', side_effect=itertools.chain([0, 0], itertools.repeat(1000)))
+    def test_timeout_clears_cache(self, mock_time, mock_sleep, mock_print):
+        """Test that a poll that times out leaves no cached result behind"""
+        self.client.session.get.return_value = self._response(200, {'status': 'processing'}, '"v1"')
+        
+        with self.assertRaises(TimeoutError):
+            self.client.wait_for_analysis('a1', max_wait=10)
+        self.assertNotIn('a1', self.client._analysis_cache)
+
+
 def run_tests():
     """Run all tests with verbose output"""
     # Create test suite
@@ -382,6 +646,8 @@ def run_tests():
     suite.addTests(loader.loadTestsFromTestCase(TestSCPAnonymizer))
     suite.addTests(loader.loadTestsFromTestCase(TestIntegration))
     suite.addTests(loader.loadTestsFromTestCase(TestDataValidation))
+    suite.addTests(loader.loadTestsFromTestCase(TestAnonymizationVerifier))
+    suite.addTests(loader.loadTestsFromTestCase(TestIdovenAPIClient))
     
     # Run tests
     runner = unittest.TextTestRunner(verbosity=2)
@@ -7,30 +7,64 @@ Author: Farhad Abtahi
 View and analyze logs with filtering and summary statistics.
 """
 
+import locale
+import mmap
 import os
 import sys
 from pathlib import Path
 from datetime import datetime, timedelta
 import argparse
+import functools
 from collections import defaultdict
 
 
 def parse_log_line(line):
     """Parse a log line to extract timestamp, level, and message"""
-    try:
-        parts = line.split(' | ')
-        if len(parts) >= 3:
-            timestamp = parts[0].strip()
-            level = parts[1].strip()
-            message = ' | '.join(parts[2:]).strip()
-            return {
-                'timestamp': timestamp,
-                'level': level,
-                'message': message
-            }
-    except:
-        pass
-    return None
+    # The message is everything after the second separator, ' | ' included
+    timestamp, found, rest = line.partition(' | ')
+    if not found:
+        return None
+    level, found, message = rest.partition(' | ')
+    if not found:
+        return None
+    return {
+        'timestamp': timestamp.strip(),
+        'level': level.strip(),
+        'message': message.strip()
+    }
+
+
+def _read_log_text(log_file):
+    """Read a log file as text, decoding straight from a memory map of it"""
+    with open(log_file, 'rb') as f:
+        # Empty files cannot be mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return ''
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            text = str(mapped, locale.getpreferredencoding(False))
+    # Newlines as text mode would translate them
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+def _read_log_file(log_file, activity, level=None):
+    """Parse all entries of one log file, optionally keeping only one level"""
+    entries = []
+    file_name = log_file.name
+    for line in _read_log_text(log_file).split('\n'):
+        entry = parse_log_line(line)
+        if entry is None or (level and entry['level'] != level):
+            continue
+        entry['file'] = file_name
+        entry['activity'] = activity
+        entries.append(entry)
+    return entries
+
+
+def _is_older_log(file_date_str, last_skipped_day):
+    """Whether a YYYYMMDD file stamp is on or before the last day to skip"""
+    return len(file_date_str) == 8 and file_date_str.isdigit() and file_date_str <= last_skipped_day
 
 
 def read_logs(log_dir='logs', days_back=7, activity_filter=None, level_filter=None):
@@ -42,85 +76,81 @@ def read_logs(log_dir='logs', days_back=7, activity_filter=None, level_filter=No
     
     logs = []
     cutoff_date = datetime.now() - timedelta(days=days_back)
+    # A YYYYMMDD stamp is older than the cutoff when its midnight is, which
+    # for fixed-width digits is a plain string comparison with this day
+    last_skipped_day = (cutoff_date - timedelta(microseconds=1)).strftime('%Y%m%d')
+    level = level_filter.upper() if level_filter else None
     
     # Read activity logs
     activity_dir = log_path / 'activities'
     if activity_dir.exists():
-        for log_file in activity_dir.glob('*.log'):
-            # Filter by activity if specified
-            if activity_filter and activity_filter not in log_file.stem:
+        with os.scandir(activity_dir) as entries:
+            for log_file in entries:
+                if not log_file.name.endswith('.log'):
+                    continue
+                stem = os.path.splitext(log_file.name)[0]
+                
+                # Filter by activity if specified
+                if activity_filter and activity_filter not in stem:
+                    continue
+                
+                # Check file date
+                if _is_older_log(stem.split('_')[-1], last_skipped_day):
+                    continue
+                
+                # Read file
+                logs.extend(_read_log_file(log_file, stem.split('_')[0], level))
+    
+    # Read main logs
+    with os.scandir(log_path) as entries:
+        for log_file in entries:
+            if not (log_file.name.startswith('scp_tools_') and log_file.name.endswith('.log')):
                 continue
+            stem = os.path.splitext(log_file.name)[0]
             
-            # Check file date
-            file_date_str = log_file.stem.split('_')[-1]
-            try:
-                if len(file_date_str) == 8:  # YYYYMMDD format
-                    file_date = datetime.strptime(file_date_str, '%Y%m%d')
-                    if file_date < cutoff_date:
-                        continue
-            except:
-                pass
+            if _is_older_log(stem.split('_')[-1], last_skipped_day):
+                continue
             
-            # Read file
-            with open(log_file, 'r') as f:
-                for line in f:
-                    parsed = parse_log_line(line)
-                    if parsed:
-                        if level_filter and parsed['level'] != level_filter.upper():
-                            continue
-                        parsed['file'] = log_file.name
-                        parsed['activity'] = log_file.stem.split('_')[0]
-                        logs.append(parsed)
-    
-    # Read main logs
-    for log_file in log_path.glob('scp_tools_*.log'):
-        file_date_str = log_file.stem.split('_')[-1]
-        try:
-            if len(file_date_str) == 8:
-                file_date = datetime.strptime(file_date_str, '%Y%m%d')
-                if file_date < cutoff_date:
-                    continue
-        except:
-            pass
-        
-        with open(log_file, 'r') as f:
-            for line in f:
-                parsed = parse_log_line(line)
-                if parsed:
-                    if level_filter and parsed['level'] != level_filter.upper():
-                        continue
-                    parsed['file'] = log_file.name
-                    parsed['activity'] = 'main'
-                    logs.append(parsed)
+            logs.extend(_read_log_file(log_file, 'main', level))
     
     return logs
 
 
 def generate_summary(logs):
     """Generate summary statistics from logs"""
-    summary = {
-        'total': len(logs),
-        'by_level': defaultdict(int),
-        'by_activity': defaultdict(int),
-        'success_count': 0,
-        'failure_count': 0,
-        'errors': [],
-        'warnings': []
-    }
+    by_level = defaultdict(int)
+    by_activity = defaultdict(int)
+    errors = []
+    warnings = []
+    success_count = failure_count = 0
     
+    # One pass with everything bound to locals; each entry's level and
+    # message are looked up once
     for log in logs:
-        summary['by_level'][log['level']] += 1
-        summary['by_activity'][log['activity']] += 1
+        level = log['level']
+        message = log['message']
+        by_level[level] += 1
+        by_activity[log['activity']] += 1
         
-        if 'SUCCESS:' in log['message']:
-            summary['success_count'] += 1
-        elif 'FAILED:' in log['message']:
-            summary['failure_count'] += 1
+        if 'SUCCESS:' in message:
+            success_count += 1
+        elif 'FAILED:' in message:
+            failure_count += 1
         
-        if log['level'] == 'ERROR':
-            summary['errors'].append(log)
-        elif log['level'] == 'WARNING':
-            summary['warnings'].append(log)
+        if level == 'ERROR':
+            errors.append(log)
+        elif level == 'WARNING':
+            warnings.append(log)
+    
+    summary = {
+        'total': len(logs),
+        'by_level': by_level,
+        'by_activity': by_activity,
+        'success_count': success_count,
+        'failure_count': failure_count,
+        'errors': errors,
+        'warnings': warnings
+    }
     
     return summary
 
@@ -131,50 +161,57 @@ def display_logs(logs, verbose=False):
         print("No logs found matching criteria")
         return
     
-    print(f"\nFound {len(logs)} log entries")
-    print("="*80)
+    # Collect the report and write it in one go rather than a print per line,
+    # which a terminal would flush line by line
+    lines = []
+    
+    lines.append(f"\nFound {len(logs)} log entries")
+    lines.append("="*80)
     
     if verbose:
         # Show all logs
-        for log in logs:
-            print(f"{log['timestamp']} | {log['level']:8} | {log['activity']:10} | {log['message']}")
+        lines.extend(f"{log['timestamp']} | {log['level']:8} | {log['activity']:10} | {log['message']}"
+                     for log in logs)
     else:
         # Show summary
         summary = generate_summary(logs)
         
-        print("\nSUMMARY")
-        print("-"*40)
-        print(f"Total entries: {summary['total']}")
-        print(f"Successful operations: {summary['success_count']}")
-        print(f"Failed operations: {summary['failure_count']}")
+        lines.append("\nSUMMARY")
+        lines.append("-"*40)
+        lines.append(f"Total entries: {summary['total']}")
+        lines.append(f"Successful operations: {summary['success_count']}")
+        lines.append(f"Failed operations: {summary['failure_count']}")
         
-        print("\nBy Level:")
+        lines.append("\nBy Level:")
         for level, count in summary['by_level'].items():
-            print(f"  {level:8}: {count}")
+            lines.append(f"  {level:8}: {count}")
         
-        print("\nBy Activity:")
+        lines.append("\nBy Activity:")
         for activity, count in summary['by_activity'].items():
-            print(f"  {activity:10}: {count}")
+            lines.append(f"  {activity:10}: {count}")
         
         if summary['errors']:
-            print(f"\nRecent Errors ({len(summary['errors'])} total):")
+            lines.append(f"\nRecent Errors ({len(summary['errors'])} total):")
             for error in summary['errors'][-5:]:  # Show last 5 errors
-                print(f"  {error['timestamp']} - {error['message'][:60]}...")
+                lines.append(f"  {error['timestamp']} - {error['message'][:60]}...")
         
         if summary['warnings']:
-            print(f"\nRecent Warnings ({len(summary['warnings'])} total):")
+            lines.append(f"\nRecent Warnings ({len(summary['warnings'])} total):")
             for warning in summary['warnings'][-5:]:  # Show last 5 warnings
-                print(f"  {warning['timestamp']} - {warning['message'][:60]}...")
+                lines.append(f"  {warning['timestamp']} - {warning['message'][:60]}...")
         
         # Calculate success rate
         total_ops = summary['success_count'] + summary['failure_count']
         if total_ops > 0:
             success_rate = (summary['success_count'] / total_ops) * 100
-            print(f"\nSuccess Rate: {success_rate:.1f}%")
+            lines.append(f"\nSuccess Rate: {success_rate:.1f}%")
+    
+    sys.stdout.write('\n'.join(lines) + '\n')
 
 
-def main():
-    """Main entry point"""
+@functools.lru_cache(maxsize=1)
+def _build_parser():
+    """Build the command-line parser once; main() and callers reuse it"""
     parser = argparse.ArgumentParser(
         description='View and analyze SCP-ECG Tools logs',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -208,7 +245,12 @@ Examples:
     parser.add_argument('--log-dir', default='logs',
                        help='Log directory path (default: logs)')
     
-    args = parser.parse_args()
+    return parser
+
+
+def main():
+    """Main entry point"""
+    args = _build_parser().parse_args()
     
     # Read logs
     logs = read_logs(